@@ -0,0 +1,69 @@
+"""Counts of related hero_powers for the hero and power lists.
+
+``counts=power_count,strong_count`` adds those keys to every item on a
+page. They come from one grouped query over the page's ids, so the cost
+depends on the page size, not on the table. Sorting by a count has to
+rank every row. The list query then joins a grouped subquery with that
+count for every row, and rows without hero_powers count as 0.
+"""
+from sqlalchemy import select, func, case
+
+from models import HeroPower, StrengthLevel
+
+
+class RelatedCounts:
+    """hero_power counts for the rows of ``id_column``, grouped by ``key_column``"""
+
+    def __init__(self, key_column, id_column, total_name):
+        self.key_column = key_column
+        self.id_column = id_column
+        aggregates = {total_name: func.count()}
+        for level in StrengthLevel:
+            aggregates[f"{level.name.lower()}_count"] = func.sum(case((HeroPower.strength == level, 1), else_=0))
+        self.aggregates = {name: aggregate.label(name) for name, aggregate in aggregates.items()}
+        # One subquery per sort key, so sorting by the total only reads the covering index on key_column
+        self.subqueries = {
+            name: select(key_column.label('owner_id'), aggregate).group_by(key_column).subquery(f"{name}s")
+            for name, aggregate in self.aggregates.items()
+        }
+        self.sorts = {
+            name: func.coalesce(subquery.c[name], 0).label(name) for name, subquery in self.subqueries.items()
+        }
+
+    def from_args(self, args):
+        """The counts named by a request's ``counts=a,b`` parameter"""
+        names = [name.strip() for name in args.get('counts', '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.aggregates]
+        if unknown:
+            raise ValueError(
+                f"Unknown counts: {', '.join(unknown)}. Allowed counts: {', '.join(self.aggregates)}"
+            )
+        return names
+
+    def used_by(self, args):
+        """Whether a list response depends on hero_powers: it embeds counts or is sorted by one"""
+        return bool(args.get('counts')) or args.get('sort', '').lstrip('-') in self.sorts
+
+    def join(self, stmt, page_request):
+        """Join every row's counts when the page is sorted by one of them"""
+        subquery = self.subqueries.get(page_request.sort_key)
+        if subquery is None:
+            return stmt
+        return stmt.outerjoin(subquery, subquery.c.owner_id == self.id_column)
+
+    def attach(self, session, rows, items, names):
+        """Add the ``names`` counts to the items built from ``rows``"""
+        if not names or not rows:
+            return items
+        ids = [row._mapping[self.id_column] for row in rows]
+        found = {
+            row[0]: row[1:] for row in session.execute(
+                select(self.key_column, *(self.aggregates[name] for name in names))
+                .where(self.key_column.in_(ids))
+                .group_by(self.key_column)
+            )
+        }
+        zeros = (0,) * len(names)
+        for id, item in zip(ids, items):
+            item.update(zip(names, found.get(id, zeros)))
+        return items
@@ -1,41 +1,67 @@
-from flask import Flask, request, jsonify
-from flask_migrate import Migrate
-from flask_mail import Mail, Message
+from flask import Flask, Blueprint, Response, abort, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, HTTPException
+from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError
 import os
-from datetime import datetime
+import json
+import time
+from datetime import datetime, timezone
 import logging
 from functools import wraps
 
-from models import db, Hero, Power, HeroPower, StrengthLevel, create_hero, create_power, assign_power_to_hero
+import click
 
-app = Flask(__name__)
+from models import (
+    db, Hero, Power, HeroPower, StrengthLevel, coerce_strength, create_hero, create_power, assign_power_to_hero,
+    load_hero_powers, load_power_heroes, load_hero_power_parents,
+    bulk_upsert_heroes, bulk_upsert_powers, bulk_assign_powers
+)
+from pagination import PageRequest, paginate, key_columns
+from search import install_search, apply_search
+from cache import response_cache
+from conditional import conditional, make_validators
+from stats import install_counters, reconcile_counters, read_stats
+from export import EXPORT_MODELS, EXPORT_FORMATS, export_rows
+from mail_queue import MailQueue
+from serializers import FastJSONProvider, HERO_PLAN, POWER_PLAN, HERO_POWER_PLAN
+from query_plans import check_query_plans
+from engine_profile import engine_options, sqlite_pragmas, install_pragmas
+from replicas import replicas, replica_binds
+from instrumentation import instrumentation
+from aggregates import RelatedCounts
+from graph import power_graph, bit_ids, popcount
+from changes import (
+    track_changes, read_changes, head_token, compact_changes, ResyncRequired, RESOURCES, DEFAULT_LIMIT, MAX_LIMIT
+)
+from versions import table_versions, modified_columns, write_time
 
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///superheroes.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
-app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
+api = Blueprint('api', __name__, url_prefix='/api', cli_group=None)
+mail_queue = MailQueue()
 
-CORS(app)
-mail = Mail(app)
-db.init_app(app)
-migrate = Migrate(app, db)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+HERO_COUNTS = RelatedCounts(HeroPower.hero_id, Hero.id, 'power_count')
+POWER_COUNTS = RelatedCounts(HeroPower.power_id, Power.id, 'hero_count')
+
+# Every column sort key has an index ending in the primary key, so pages are read in index order.
+# Count sort keys rank every row through the grouped subquery instead.
+HERO_SORTS = {'id': Hero.id, 'name': Hero.name, 'super_name': Hero.super_name, 'updated_at': Hero.updated_at,
+              **HERO_COUNTS.sorts}
+POWER_SORTS = {'id': Power.id, 'name': Power.name, 'updated_at': Power.updated_at, **POWER_COUNTS.sorts}
+HERO_POWER_SORTS = {'id': HeroPower.id, 'updated_at': HeroPower.updated_at}
+MAX_LIST_IDS = 100
+GRAPH_DEFAULT_LIMIT = 100
+GRAPH_MAX_LIMIT = 1000
+GRAPH_RETRY_AFTER = 10
+
 def handle_errors(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except HTTPException:
+            raise
         except ValueError as e:
             return jsonify({"errors": [str(e)]}), 400
         except IntegrityError as e:
@@ -67,20 +93,229 @@ def validate_json_data(required_fields=None):
         return decorated_function
     return decorator
 
-@app.errorhandler(404)
+def read_bulk_items():
+    """Parse a bulk body: a JSON array, ``{"items": [...]}`` or NDJSON.
+
+    Returns ``(items, errors)``; NDJSON lines that fail to parse become
+    ``None`` items with an error recorded at their index.
+    """
+    errors = []
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                errors.append({"index": len(items), "errors": ["Invalid JSON"]})
+                items.append(None)
+    elif request.is_json:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError("Body must be a JSON array or an object with an items array")
+    else:
+        raise ValueError("Request must be JSON or NDJSON")
+
+    if not items:
+        raise ValueError("No data provided")
+    if len(items) > current_app.config['BULK_MAX_ITEMS']:
+        raise ValueError(f"At most {current_app.config['BULK_MAX_ITEMS']} items per request")
+    return items, errors
+
+def id_list_arg(name):
+    """A comma-separated list of integer ids from the query string, e.g. ``?all=1,2,3``"""
+    raw = request.args.get(name, '')
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError(f"{name} must be a comma-separated list of integer ids")
+    if len(ids) > MAX_LIST_IDS:
+        raise ValueError(f"At most {MAX_LIST_IDS} ids in {name}")
+    return ids
+
+def limit_arg(default, maximum):
+    limit = request.args.get('limit', default, type=int)
+    return min(limit, maximum) if limit > 0 else default
+
+def strength_arg():
+    return coerce_strength(request.args['strength']) if 'strength' in request.args else None
+
+def strength_list_arg():
+    return [coerce_strength(value.strip()) for value in request.args.get('strength', '').split(',') if value.strip()]
+
+def datetime_arg(name):
+    """An ISO 8601 timestamp from the query string as naive UTC, like the stored ``updated_at``"""
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        value = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def default_sort():
+    """A time range is served by the updated_at index, so it orders by updated_at unless told otherwise"""
+    return 'updated_at' if 'updated_since' in request.args or 'updated_before' in request.args else 'id'
+
+def filter_updated(query, column):
+    """Apply ``updated_since`` (inclusive) and ``updated_before`` (exclusive)"""
+    since, before = datetime_arg('updated_since'), datetime_arg('updated_before')
+    if since:
+        query = query.where(column >= since)
+    if before:
+        query = query.where(column < before)
+    return query
+
+def bulk_response(upsert):
+    """Run ``upsert`` over the request's items in one transaction and report per-item failures"""
+    items, errors = read_bulk_items()
+    started = time.perf_counter()
+    written, item_errors = upsert(items)
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+
+    errors = sorted(errors + item_errors, key=lambda error: error["index"])
+    status = 200 if not errors else (207 if written else 400)
+    return jsonify({
+        "received": len(items),
+        "written": written,
+        "failed": len(errors),
+        "errors": errors,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(written / elapsed, 1) if elapsed > 0 else None
+    }), status
+
+def hero_detail_tags(view_args, payload):
+    """A hero's detail embeds its powers, so it goes stale when any of them changes"""
+    return [f"hero:{view_args['id']}"] + [f"power:{hp['power_id']}" for hp in payload['hero_powers']]
+
+def power_detail_tags(view_args, payload):
+    return [f"power:{view_args['id']}"] + [f"hero:{hero['id']}" for hero in payload.get('heroes', [])]
+
+def embeds_relations(counts, include):
+    """Whether a list response depends on hero_powers: counts, a count sort or ``ids=`` with ``include``"""
+    included = 'ids' in request.args and request.args.get(include, 'false').lower() == 'true'
+    return included or counts.used_by(request.args)
+
+def version_validators(resources):
+    """Validators from the tables' versions: every insert, update and delete bumps one"""
+    versions = table_versions(db.session, resources)
+    return make_validators(*versions, modified=[modified for _, modified in versions])
+
+def detail_validators(row, tables):
+    """ETag from a row's own aggregates; Last-Modified from the write times of the ``tables`` trailing it"""
+    return make_validators(*row[:-tables], modified=[write_time(value) for value in row[-tables:]])
+
+def ids_validators(model, counts, include):
+    """``ids=`` depends only on the rows asked for and, when embedded, their hero_powers and related rows"""
+    ids = id_list_arg('ids')
+    columns = [func.count(model.id), func.max(model.updated_at)]
+    tables = [model.__tablename__]
+    if embeds_relations(counts, include):
+        related, related_key = (Power, HeroPower.power_id) if model is Hero else (Hero, HeroPower.hero_id)
+        owned = counts.key_column.in_(ids)
+        columns += [
+            select(func.count(HeroPower.id)).where(owned).scalar_subquery(),
+            select(func.max(HeroPower.updated_at)).where(owned).scalar_subquery(),
+            select(func.max(related.updated_at))
+            .join(HeroPower, related_key == related.id).where(owned).scalar_subquery()
+        ]
+        tables = list(RESOURCES)
+    row = db.session.execute(select(*columns, *modified_columns(tables)).where(model.id.in_(ids))).one()
+    return detail_validators(row, len(tables))
+
+def list_validators(model, counts, include):
+    """Lists that embed hero_power counts or related rows depend on every table"""
+    def validators(view_args):
+        if 'ids' in request.args:
+            return ids_validators(model, counts, include)
+        return version_validators(list(RESOURCES) if embeds_relations(counts, include) else [model.__tablename__])
+    return validators
+
+def list_tags(tag, counts, include):
+    """Any hero or power write also tags ``hero_powers``, so that tag covers embedded relations"""
+    def tags(view_args, payload):
+        return [tag, 'hero_powers'] if embeds_relations(counts, include) else [tag]
+    return tags
+
+def get_by_ids(model, plan, counts, include, load):
+    """``ids=`` on a list endpoint: the rows with those ids, in the order asked, and the ids not found.
+
+    The rows come from one ``IN`` query. With ``include=true`` each row is
+    returned in its detail representation instead, with the relations of
+    all rows eager-loaded together; ``fields=`` and ``counts=`` are then
+    rejected rather than ignored.
+    """
+    ids = list(dict.fromkeys(id_list_arg('ids')))
+    if request.args.get(include, 'false').lower() == 'true':
+        shaping = [name for name in ('fields', 'counts') if name in request.args]
+        if shaping:
+            raise ValueError(f"{' and '.join(shaping)} cannot be combined with {include}=true")
+        found = {
+            row.id: row.to_dict(**{include: True})
+            for row in model.query.options(load()).filter(model.id.in_(ids))
+        }
+    else:
+        names = counts.from_args(request.args)
+        plan = plan.from_args(request.args, [model.id])
+        rows = db.session.execute(select(*plan.columns).where(model.id.in_(ids))).all()
+        items = counts.attach(db.session, rows, plan.to_dicts(rows), names)
+        found = {row._mapping[model.id]: item for row, item in zip(rows, items)}
+    return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+def hero_power_list_validators(view_args):
+    """hero_powers items embed their hero and power, so every table's version counts"""
+    return version_validators(list(RESOURCES))
+
+def stats_validators(view_args):
+    return version_validators(list(RESOURCES))
+
+def hero_detail_validators(view_args):
+    """The hero's row with its hero_powers' count and newest updated_at: a removed hero_power lowers the count"""
+    row = db.session.execute(
+        select(Hero.updated_at, func.count(HeroPower.id), func.max(HeroPower.updated_at), func.max(Power.updated_at),
+               *modified_columns(RESOURCES))
+        .outerjoin(HeroPower, HeroPower.hero_id == Hero.id)
+        .outerjoin(Power, Power.id == HeroPower.power_id)
+        .where(Hero.id == view_args['id'])
+        .group_by(Hero.id)
+    ).first()
+    return detail_validators(row, len(RESOURCES)) if row else None
+
+def power_detail_validators(view_args):
+    query = select(Power.updated_at).where(Power.id == view_args['id']).group_by(Power.id)
+    tables = ['powers']
+    if request.args.get('include_heroes', 'false').lower() == 'true':
+        query = query.add_columns(func.count(HeroPower.id), func.max(HeroPower.updated_at), func.max(Hero.updated_at)) \
+            .outerjoin(HeroPower, HeroPower.power_id == Power.id) \
+            .outerjoin(Hero, Hero.id == HeroPower.hero_id)
+        tables = list(RESOURCES)
+    row = db.session.execute(query.add_columns(*modified_columns(tables))).first()
+    return detail_validators(row, len(tables)) if row else None
+
+def ranked(page_request):
+    """Search results are ordered by relevance unless the client pages by cursor or picks a sort"""
+    return not page_request.keyset and 'sort' not in request.args
+
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Resource not found"}), 404
 
-@app.errorhandler(400)
+@api.app_errorhandler(400)
 def bad_request(error):
     return jsonify({"error": "Bad request"}), 400
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         "status": "healthy",
@@ -88,39 +323,35 @@ def health_check():
         "version": "1.0.0"
     }), 200
 
-@app.route('/api/heroes', methods=['GET'])
+@api.route('/heroes', methods=['GET'])
 @handle_errors
+@replicas.reads
+@conditional(list_validators(Hero, HERO_COUNTS, 'include_powers'))
+@response_cache.cached(tags=list_tags('heroes', HERO_COUNTS, 'include_powers'))
 def get_heroes():
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    if 'ids' in request.args:
+        items, missing = get_by_ids(Hero, HERO_PLAN, HERO_COUNTS, 'include_powers', load_hero_powers)
+        return jsonify({"heroes": items, "missing": missing}), 200
+    
+    page_request = PageRequest.from_args(request.args, HERO_SORTS, default_sort())
     search = request.args.get('search', '')
     
-    query = Hero.query
+    counts = HERO_COUNTS.from_args(request.args)
+    
+    plan = HERO_PLAN.from_args(request.args, key_columns(page_request, HERO_SORTS, Hero.id))
+    
+    query = filter_updated(HERO_COUNTS.join(db.select(*plan.columns), page_request), Hero.updated_at)
     if search:
-        query = query.filter(
-            Hero.name.ilike(f'%{search}%') | 
-            Hero.super_name.ilike(f'%{search}%')
-        )
-    
-    heroes = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
+        query = apply_search(db.session, query, Hero, search, rank=ranked(page_request))
+    
+    rows, pagination = paginate(db.session, query, page_request, HERO_SORTS, Hero.id, scalars=False)
     
     return jsonify({
-        "heroes": [hero.to_dict(include_powers=False) for hero in heroes.items],
-        "pagination": {
-            "page": page,
-            "per_page": per_page,
-            "total": heroes.total,
-            "pages": heroes.pages,
-            "has_next": heroes.has_next,
-            "has_prev": heroes.has_prev
-        }
+        "heroes": HERO_COUNTS.attach(db.session, rows, plan.to_dicts(rows), counts),
+        "pagination": pagination
     }), 200
 
-@app.route('/api/heroes', methods=['POST'])
+@api.route('/heroes', methods=['POST'])
 @handle_errors
 @validate_json_data(required_fields=['name', 'super_name'])
 def create_hero_endpoint():
@@ -134,13 +365,21 @@ def create_hero_endpoint():
     db.session.commit()
     return jsonify(hero.to_dict()), 201
 
-@app.route('/api/heroes/<int:id>', methods=['GET'])
+@api.route('/heroes/bulk', methods=['POST'])
 @handle_errors
+def bulk_heroes():
+    return bulk_response(bulk_upsert_heroes)
+
+@api.route('/heroes/<int:id>', methods=['GET'])
+@handle_errors
+@replicas.reads
+@conditional(hero_detail_validators)
+@response_cache.cached(tags=hero_detail_tags)
 def get_hero(id):
-    hero = Hero.query.get_or_404(id)
+    hero = Hero.query.options(load_hero_powers()).get_or_404(id)
     return jsonify(hero.to_dict(include_powers=True)), 200
 
-@app.route('/api/heroes/<int:id>', methods=['PATCH'])
+@api.route('/heroes/<int:id>', methods=['PATCH'])
 @handle_errors
 @validate_json_data()
 def update_hero(id):
@@ -153,9 +392,11 @@ def update_hero(id):
         hero.super_name = data['super_name']
     
     db.session.commit()
+    # Reload with the powers the response includes instead of lazy-loading them one by one
+    hero = db.session.get(Hero, id, options=[load_hero_powers()], populate_existing=True)
     return jsonify(hero.to_dict()), 200
 
-@app.route('/api/heroes/<int:id>', methods=['DELETE'])
+@api.route('/heroes/<int:id>', methods=['DELETE'])
 @handle_errors
 def delete_hero(id):
     hero = Hero.query.get_or_404(id)
@@ -163,39 +404,35 @@ def delete_hero(id):
     db.session.commit()
     return jsonify({"message": "Hero deleted successfully"}), 200
 
-@app.route('/api/powers', methods=['GET'])
+@api.route('/powers', methods=['GET'])
 @handle_errors
+@replicas.reads
+@conditional(list_validators(Power, POWER_COUNTS, 'include_heroes'))
+@response_cache.cached(tags=list_tags('powers', POWER_COUNTS, 'include_heroes'))
 def get_powers():
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    if 'ids' in request.args:
+        items, missing = get_by_ids(Power, POWER_PLAN, POWER_COUNTS, 'include_heroes', load_power_heroes)
+        return jsonify({"powers": items, "missing": missing}), 200
+    
+    page_request = PageRequest.from_args(request.args, POWER_SORTS, default_sort())
     search = request.args.get('search', '')
     
-    query = Power.query
+    counts = POWER_COUNTS.from_args(request.args)
+    
+    plan = POWER_PLAN.from_args(request.args, key_columns(page_request, POWER_SORTS, Power.id))
+    
+    query = filter_updated(POWER_COUNTS.join(db.select(*plan.columns), page_request), Power.updated_at)
     if search:
-        query = query.filter(
-            Power.name.ilike(f'%{search}%') | 
-            Power.description.ilike(f'%{search}%')
-        )
-    
-    powers = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
+        query = apply_search(db.session, query, Power, search, rank=ranked(page_request))
+    
+    rows, pagination = paginate(db.session, query, page_request, POWER_SORTS, Power.id, scalars=False)
     
     return jsonify({
-        "powers": [power.to_dict(include_heroes=False) for power in powers.items],
-        "pagination": {
-            "page": page,
-            "per_page": per_page,
-            "total": powers.total,
-            "pages": powers.pages,
-            "has_next": powers.has_next,
-            "has_prev": powers.has_prev
-        }
+        "powers": POWER_COUNTS.attach(db.session, rows, plan.to_dicts(rows), counts),
+        "pagination": pagination
     }), 200
 
-@app.route('/api/powers', methods=['POST'])
+@api.route('/powers', methods=['POST'])
 @handle_errors
 @validate_json_data(required_fields=['name', 'description'])
 def create_power_endpoint():
@@ -209,14 +446,25 @@ def create_power_endpoint():
     db.session.commit()
     return jsonify(power.to_dict()), 201
 
-@app.route('/api/powers/<int:id>', methods=['GET'])
+@api.route('/powers/bulk', methods=['POST'])
+@handle_errors
+def bulk_powers():
+    return bulk_response(bulk_upsert_powers)
+
+@api.route('/powers/<int:id>', methods=['GET'])
 @handle_errors
+@replicas.reads
+@conditional(power_detail_validators)
+@response_cache.cached(tags=power_detail_tags)
 def get_power(id):
-    power = Power.query.get_or_404(id)
     include_heroes = request.args.get('include_heroes', 'false').lower() == 'true'
+    query = Power.query
+    if include_heroes:
+        query = query.options(load_power_heroes())
+    power = query.get_or_404(id)
     return jsonify(power.to_dict(include_heroes=include_heroes)), 200
 
-@app.route('/api/powers/<int:id>', methods=['PATCH'])
+@api.route('/powers/<int:id>', methods=['PATCH'])
 @handle_errors
 @validate_json_data()
 def update_power(id):
@@ -231,7 +479,7 @@ def update_power(id):
     db.session.commit()
     return jsonify(power.to_dict()), 200
 
-@app.route('/api/powers/<int:id>', methods=['DELETE'])
+@api.route('/powers/<int:id>', methods=['DELETE'])
 @handle_errors
 def delete_power(id):
     power = Power.query.get_or_404(id)
@@ -239,39 +487,40 @@ def delete_power(id):
     db.session.commit()
     return jsonify({"message": "Power deleted successfully"}), 200
 
-@app.route('/api/hero_powers', methods=['GET'])
+@api.route('/hero_powers', methods=['GET'])
 @handle_errors
+@replicas.reads
+@conditional(hero_power_list_validators)
+@response_cache.cached(tags=['hero_powers'])
 def get_hero_powers():
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
-    hero_id = request.args.get('hero_id', type=int)
-    power_id = request.args.get('power_id', type=int)
-    
-    query = HeroPower.query
-    if hero_id:
-        query = query.filter(HeroPower.hero_id == hero_id)
-    if power_id:
-        query = query.filter(HeroPower.power_id == power_id)
-    
-    hero_powers = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
+    page_request = PageRequest.from_args(request.args, HERO_POWER_SORTS, default_sort())
+    hero_ids = id_list_arg('hero_id')
+    power_ids = id_list_arg('power_id')
+    strengths = strength_list_arg()
+    
+    plan = HERO_POWER_PLAN.from_args(request.args, key_columns(page_request, HERO_POWER_SORTS, HeroPower.id))
+    
+    query = db.select(*plan.columns).select_from(HeroPower)
+    if 'power' in plan.nested:
+        query = query.join(Power, Power.id == HeroPower.power_id)
+    if 'hero' in plan.nested:
+        query = query.join(Hero, Hero.id == HeroPower.hero_id)
+    if hero_ids:
+        query = query.where(HeroPower.hero_id.in_(hero_ids))
+    if power_ids:
+        query = query.where(HeroPower.power_id.in_(power_ids))
+    if strengths:
+        query = query.where(HeroPower.strength.in_(strengths))
+    query = filter_updated(query, HeroPower.updated_at)
+    
+    rows, pagination = paginate(db.session, query, page_request, HERO_POWER_SORTS, HeroPower.id, scalars=False)
     
     return jsonify({
-        "hero_powers": [hp.to_dict() for hp in hero_powers.items],
-        "pagination": {
-            "page": page,
-            "per_page": per_page,
-            "total": hero_powers.total,
-            "pages": hero_powers.pages,
-            "has_next": hero_powers.has_next,
-            "has_prev": hero_powers.has_prev
-        }
+        "hero_powers": plan.to_dicts(rows),
+        "pagination": pagination
     }), 200
 
-@app.route('/api/hero_powers', methods=['POST'])
+@api.route('/hero_powers', methods=['POST'])
 @handle_errors
 @validate_json_data(required_fields=['strength', 'power_id', 'hero_id'])
 def create_hero_power():
@@ -282,11 +531,18 @@ def create_hero_power():
         power_id=data['power_id'],
         strength_level=data['strength']
     )
+    hero_power_id = hero_power.id
     
     db.session.commit()
+    hero_power = db.session.get(HeroPower, hero_power_id, options=load_hero_power_parents(), populate_existing=True)
     return jsonify(hero_power.to_dict()), 201
 
-@app.route('/api/hero_powers/<int:id>', methods=['PATCH'])
+@api.route('/hero_powers/bulk', methods=['POST'])
+@handle_errors
+def bulk_hero_powers():
+    return bulk_response(bulk_assign_powers)
+
+@api.route('/hero_powers/<int:id>', methods=['PATCH'])
 @handle_errors
 @validate_json_data()
 def update_hero_power(id):
@@ -297,9 +553,10 @@ def update_hero_power(id):
         hero_power.strength = data['strength']
     
     db.session.commit()
+    hero_power = db.session.get(HeroPower, id, options=load_hero_power_parents(), populate_existing=True)
     return jsonify(hero_power.to_dict()), 200
 
-@app.route('/api/hero_powers/<int:id>', methods=['DELETE'])
+@api.route('/hero_powers/<int:id>', methods=['DELETE'])
 @handle_errors
 def delete_hero_power(id):
     hero_power = HeroPower.query.get_or_404(id)
@@ -307,38 +564,178 @@ def delete_hero_power(id):
     db.session.commit()
     return jsonify({"message": "Hero power deleted successfully"}), 200
 
-@app.route('/api/strength_levels', methods=['GET'])
+@api.route('/changes', methods=['GET'])
+@handle_errors
+@replicas.reads
+def get_changes():
+    """Writes since ``since``; without it, just the current token to start syncing from"""
+    if 'since' not in request.args:
+        return jsonify({"changes": [], "next": head_token(db.session), "has_more": False}), 200
+    
+    try:
+        since = int(request.args['since'])
+    except ValueError:
+        raise ValueError("since must be a token returned as next by /api/changes")
+    limit = limit_arg(DEFAULT_LIMIT, MAX_LIMIT)
+    
+    try:
+        changes, next_token, has_more = read_changes(db.session, since, limit)
+    except ResyncRequired as e:
+        return jsonify({"errors": [str(e)], "next": head_token(db.session)}), 410
+    
+    return jsonify({"changes": changes, "next": next_token, "has_more": has_more}), 200
+
+def graph_query(f):
+    """Answer 503 until this worker's graph is built, then bring it up to date before the view"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not power_graph.ready:
+            power_graph.start()
+            return jsonify({"errors": ["The graph is still being built; retry shortly"]}), 503, \
+                {'Retry-After': str(GRAPH_RETRY_AFTER)}
+        power_graph.refresh()
+        return f(*args, **kwargs)
+    return decorated_function
+
+@api.route('/graph/heroes', methods=['GET'])
+@handle_errors
+@replicas.reads
+@graph_query
+def graph_heroes():
+    """Heroes holding all of ``all``, at least one of ``any`` and none of ``none`` (power ids)"""
+    all_of, any_of, none_of = id_list_arg('all'), id_list_arg('any'), id_list_arg('none')
+    if not all_of and not any_of:
+        raise ValueError("Give power ids in all and/or any")
+    strength = strength_arg()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = limit_arg(GRAPH_DEFAULT_LIMIT, GRAPH_MAX_LIMIT)
+    
+    heroes = power_graph.heroes_matching(all_of, any_of, none_of, strength)
+    
+    return jsonify({
+        "count": popcount(heroes),
+        "hero_ids": bit_ids(heroes, offset, limit)
+    }), 200
+
+@api.route('/graph/heroes/<int:id>/similar', methods=['GET'])
+@handle_errors
+@replicas.reads
+@graph_query
+def graph_similar_heroes(id):
+    """Heroes sharing at least ``min_shared`` powers with this one, most shared first"""
+    if db.session.get(Hero, id) is None:
+        abort(404)
+    min_shared = max(request.args.get('min_shared', 1, type=int), 1)
+    
+    similar = power_graph.similar_heroes(id, min_shared, limit_arg(GRAPH_DEFAULT_LIMIT, GRAPH_MAX_LIMIT))
+    
+    return jsonify({
+        "heroes": [{"hero_id": hero_id, "shared": shared, "jaccard": jaccard} for hero_id, shared, jaccard in similar]
+    }), 200
+
+@api.route('/graph/powers/<int:id>/co_occurring', methods=['GET'])
+@handle_errors
+@replicas.reads
+@graph_query
+def graph_co_occurring_powers(id):
+    """Powers most often held by the same heroes as this one"""
+    if db.session.get(Power, id) is None:
+        abort(404)
+    
+    counts = power_graph.co_occurring(id, limit_arg(GRAPH_DEFAULT_LIMIT, GRAPH_MAX_LIMIT))
+    
+    return jsonify({"powers": [{"power_id": power_id, "heroes": heroes} for power_id, heroes in counts]}), 200
+
+@api.route('/graph/powers/ranking', methods=['GET'])
+@handle_errors
+@replicas.reads
+@graph_query
+def graph_power_ranking():
+    """Powers ranked by number of holders, optionally only those at ``strength``"""
+    strength = strength_arg()
+    
+    counts = power_graph.power_ranking(strength, limit_arg(GRAPH_DEFAULT_LIMIT, GRAPH_MAX_LIMIT))
+    
+    return jsonify({"powers": [{"power_id": power_id, "holders": holders} for power_id, holders in counts]}), 200
+
+@api.route('/strength_levels', methods=['GET'])
 def get_strength_levels():
     return jsonify({
         "strength_levels": [level.value for level in StrengthLevel]
     }), 200
 
-@app.route('/api/send_mail', methods=['POST'])
-@handle_errors
-@validate_json_data(required_fields=['to', 'subject', 'body'])
-def send_mail():
-    if not app.config['MAIL_USERNAME'] or not app.config['MAIL_PASSWORD']:
-        return jsonify({"errors": ["Mail configuration not set up"]}), 400
+def build_message(data):
+    """A Message from a send_mail payload; raises ValueError when fields are missing"""
+    from flask_mail import Message
     
-    data = request.get_json()
+    missing_fields = [field for field in ('to', 'subject', 'body') if not data.get(field)]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
     
     msg = Message(
         subject=data['subject'],
-        sender=app.config['MAIL_DEFAULT_SENDER'] or app.config['MAIL_USERNAME'],
+        sender=current_app.config['MAIL_DEFAULT_SENDER'] or current_app.config['MAIL_USERNAME'],
         recipients=[data['to']],
         body=data['body']
     )
     
     if 'html' in data:
         msg.html = data['html']
+    return msg
+
+def mail_configured():
+    return bool(current_app.config['MAIL_SERVER'] and (current_app.config['MAIL_DEFAULT_SENDER'] or current_app.config['MAIL_USERNAME']))
+
+@api.route('/send_mail', methods=['POST'])
+@handle_errors
+@validate_json_data(required_fields=['to', 'subject', 'body'])
+def send_mail():
+    if not mail_configured():
+        return jsonify({"errors": ["Mail configuration not set up"]}), 400
     
-    mail.send(msg)
-    logger.info(f"Email sent to {data['to']}")
-    return jsonify({"message": "Email sent successfully"}), 200
+    job = mail_queue.submit(build_message(request.get_json()))
+    response = jsonify({"message": "Email queued", "job_id": job.id, "status": job.status})
+    response.headers['Location'] = f'/api/send_mail/{job.id}'
+    return response, 202
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/send_mail/batch', methods=['POST'])
 @handle_errors
+def send_mail_batch():
+    if not mail_configured():
+        return jsonify({"errors": ["Mail configuration not set up"]}), 400
+    
+    items, errors = read_bulk_items()
+    jobs = []
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Item must be a JSON object")
+            jobs.append({"index": index, "job_id": mail_queue.submit(build_message(item)).id})
+        except ValueError as e:
+            errors.append({"index": index, "errors": [str(e)]})
+    
+    errors.sort(key=lambda error: error["index"])
+    return jsonify({"jobs": jobs, "errors": errors}), 202 if jobs else 400
+
+@api.route('/send_mail/<job_id>', methods=['GET'])
+def get_mail_job(job_id):
+    job = mail_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Resource not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@api.route('/stats', methods=['GET'])
+@handle_errors
+@replicas.reads
+@conditional(stats_validators)
+@response_cache.cached(tags=['stats'])
 def get_stats():
+    stats = read_stats(db.session)
+    if stats is not None:
+        return jsonify(stats), 200
+    
     total_heroes = Hero.query.count()
     total_powers = Power.query.count()
     total_hero_powers = HeroPower.query.count()
@@ -357,10 +754,181 @@ def get_stats():
         }
     }), 200
 
-with app.app_context():
+@api.route('/export/<resource>', methods=['GET'])
+@handle_errors
+def export_resource(resource):
+    if resource not in EXPORT_MODELS:
+        return jsonify({"errors": [f"Unknown export: {resource}"]}), 404
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"errors": [f"format must be one of: {', '.join(EXPORT_FORMATS)}"]}), 400
+    
+    rows = export_rows(db.session, EXPORT_MODELS[resource], fmt)
+    return Response(
+        stream_with_context(rows),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={resource}.{fmt}"}
+    )
+
+@api.cli.command('sync-replicas')
+def sync_replicas_command():
+    """Copy the primary SQLite database onto the SQLite replicas, for trying out replica routing locally"""
+    synced = replicas.sync_sqlite(db.engine)
+    for engine in synced:
+        print(f"Synced {engine.url}")
+    if not synced:
+        print("No SQLite replicas configured in DATABASE_REPLICA_URLS.")
+
+@api.route('/replicas', methods=['GET'])
+def get_replicas():
+    return jsonify({"replicas": replicas.status()}), 200
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not instrumentation.enabled:
+        abort(404)
+    return Response(instrumentation.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Rebuild the /api/stats counters from the tables and report any drift"""
+    with db.engine.begin() as connection:
+        if not install_counters(connection):
+            print("Stat counters are only maintained on SQLite; nothing to reconcile.")
+            return
+        drift = reconcile_counters(connection)
+    
+    if not drift:
+        print("Stat counters are in sync.")
+    for name, (stored, actual) in sorted(drift.items()):
+        print(f"{name}: stored {stored}, actual {actual}")
+    response_cache.invalidate('stats')
+
+def init_db():
+    """Create the tables plus the search indexes and counter triggers that live beside them"""
     db.create_all()
+    with db.engine.begin() as connection:
+        install_search(connection)
+        install_counters(connection)
+
+@api.cli.command('check-query-plans')
+def check_query_plans_command():
+    """EXPLAIN every statement the read endpoints run and fail on full table scans"""
+    app = current_app._get_current_object()
+    # Its requests only EXPLAIN the read endpoints; they should not start the graph build
+    app.config['GRAPH_BUILD_ON_START'] = False
+    failures = 0
+    for url, statement, plan, problems in check_query_plans(app, db, response_cache):
+        status = 'FAIL' if problems else 'ok'
+        failures += bool(problems)
+        print(f"[{status}] {url}: {' '.join(statement.split())[:100]}")
+        for detail in plan:
+            print(f"        {detail}")
+        for problem in problems:
+            print(f"        !! {problem}")
+    
+    if failures:
+        raise SystemExit(f"{failures} statement(s) use full table scans")
+    print("No full table scans in filtered queries.")
+
+@api.cli.command('compact-changes')
+@click.option('--tombstone-days', type=int, default=None,
+              help="Also purge deletes older than this; clients with older tokens must resync")
+def compact_changes_command(tombstone_days):
+    """Keep only the latest /api/changes entry per row"""
+    with db.engine.begin() as connection:
+        superseded, purged, floor = compact_changes(connection, tombstone_days)
+    print(f"Removed {superseded} superseded changes and {purged} tombstones; oldest usable token is {floor}.")
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables plus the search indexes and stats triggers"""
+    init_db()
+    print("Database initialized.")
+
+class MigrateCommands(click.Group):
+    """`flask db`: sets up Flask-Migrate only when one of its commands runs.
+
+    Importing alembic is the slowest part of building the app, and only
+    migrations need it, so servers and the other commands never pay for it.
+    """
+
+    def migrate_group(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as group
+        
+        app = current_app._get_current_object()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        return group
+
+    def list_commands(self, ctx):
+        return self.migrate_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_group().get_command(ctx, name)
+
+def create_app(config=None):
+    """Build the app without connecting to the database; `flask init-db` creates the schema"""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///superheroes.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'default')
+    app.config['DB_POOL_SIZE'] = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    app.config['DATABASE_REPLICA_URLS'] = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    app.config['REPLICA_RETRY_INTERVAL'] = int(os.environ.get('REPLICA_RETRY_INTERVAL', 30))
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    app.config['BULK_MAX_ITEMS'] = int(os.environ.get('BULK_MAX_ITEMS', 10000))
+    app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+    app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 60))
+    app.config['CACHE_MAXSIZE'] = int(os.environ.get('CACHE_MAXSIZE', 1024))
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
+    app.config['MAIL_QUEUE_WORKERS'] = int(os.environ.get('MAIL_QUEUE_WORKERS', 2))
+    app.config['MAIL_MAX_RETRIES'] = int(os.environ.get('MAIL_MAX_RETRIES', 3))
+    app.config['MAIL_RETRY_BACKOFF'] = float(os.environ.get('MAIL_RETRY_BACKOFF', 2.0))
+    app.config['INSTRUMENTATION_ENABLED'] = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    app.config['SERVER_TIMING_SQL'] = os.environ.get('SERVER_TIMING_SQL', 'false').lower() == 'true'
+    app.config['GRAPH_BUILD_ON_START'] = os.environ.get('GRAPH_BUILD_ON_START', 'true').lower() == 'true'
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    app.config.setdefault('SQLALCHEMY_BINDS', replica_binds(app.config['DATABASE_REPLICA_URLS']))
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    CORS(app)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            install_pragmas(engine, sqlite_pragmas(app.config))
+    instrumentation.init_app(app, db)
+    track_changes()
+    replicas.init_app(app, db)
+    response_cache.init_app(app)
+    mail_queue.init_app(app)
+    power_graph.init_app(app, db)
+    app.cli.add_command(MigrateCommands('db', help="Perform database migrations."))
+    
+    app.register_blueprint(api)
+    return app
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,79 @@
+"""ASGI entry point: `uvicorn asgi:app --workers 4`
+
+Serves the same Flask app, so routes and JSON contracts are identical to
+WSGI. The ASGI server holds idle and slow connections on its event loop
+and runs each request's view in a pool of ``ASGI_THREADS`` threads
+(default 8), so a slow client or a large page no longer blocks a whole
+worker. asgiref's own ``WsgiToAsgi`` calls the app through a
+thread-sensitive ``sync_to_async``, which runs every request of the
+process on one shared thread. The adapter here keeps its environ and
+``start_response`` handling but runs the app with
+``loop.run_in_executor`` on its own pool, and hands each response message
+back to the event loop with ``run_coroutine_threadsafe``. Raise
+``DB_POOL_SIZE`` to at least ``ASGI_THREADS``.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import create_app
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_THREADS', 8)), thread_name_prefix='asgi')
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError("WSGI wrapper received a non-HTTP scope")
+        self.scope = scope
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] != 'http.request':
+                    raise ValueError("WSGI wrapper received a non-HTTP-request message")
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            self.sync_send = lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result()
+            await loop.run_in_executor(executor, self.run_wsgi_app, body)
+
+    def run_wsgi_app(self, body):
+        """Run the app on a pool thread, sending the response as it is produced"""
+        environ = self.build_environ(self.scope, body)
+        response = self.wsgi_application(environ, self.start_response)
+        try:
+            for output in response:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                if output:
+                    self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+        finally:
+            # Runs Flask's teardown, e.g. for streamed exports
+            if hasattr(response, 'close'):
+                response.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """``WsgiToAsgi`` that runs requests concurrently on ``executor``"""
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+def __getattr__(name):
+    # Built on first use, so importing the adapter does not build an app from the environment
+    global app
+    if name == 'app':
+        app = PooledWsgiToAsgi(create_app())
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
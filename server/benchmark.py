@@ -0,0 +1,460 @@
+"""End-to-end HTTP benchmark: every route, several database sizes, two servers.
+
+For each ``--sizes`` entry a synthetic database is seeded once (see
+``seed.seed_synthetic``) and each mode starts from a fresh copy of it:
+
+* ``client`` drives the routes through the Flask test client and counts
+  the SQL statements each request runs.
+* ``gunicorn`` boots ``gunicorn.conf.py`` and sends ``--concurrency``
+  parallel requests over real HTTP.
+
+Each route records throughput, p50/p95/p99 latency, non-2xx responses
+and queries per request. Results are written as JSON. ``--compare`` diffs
+them against an earlier run, e.g. one taken on the previous commit.
+
+    python benchmark.py --sizes 1000,100000 --requests 200
+    python benchmark.py --compare benchmark-abc1234.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event
+
+from startup_benchmark import free_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAX_HEAVY_REQUESTS = 5
+SKIPPED_RULES = {'/static/<path:filename>'}
+GRAPH_PROBE = '/api/graph/powers/ranking'
+
+
+class Route:
+    """One benchmarked request shape; ``make(i, state)`` returns ``(url, json_body)``"""
+
+    def __init__(self, label, method, rule, make, heavy=False, ok=(200, 201, 202, 207), remember=None):
+        self.label = label
+        self.method = method
+        self.rule = rule
+        self.make = make
+        self.heavy = heavy
+        self.ok = ok
+        self.remember = remember
+
+
+def routes_for(size):
+    heroes = size
+    powers = powers_for(size)
+    links = 3 * size
+
+    def fixed(url, body=None):
+        return lambda i, state: (url, body)
+
+    def remember_job(state, payload):
+        state.setdefault('jobs', []).append(payload['job_id'])
+
+    def job_url(i, state):
+        jobs = state.get('jobs') or ['missing']
+        return f"/api/send_mail/{jobs[i % len(jobs)]}", None
+
+    mail = {'to': 'bench@example.com', 'subject': 'Benchmark', 'body': 'Hello'}
+    return [
+        Route('health', 'GET', '/api/health', fixed('/api/health')),
+        Route('heroes page', 'GET', '/api/heroes',
+              lambda i, state: (f"/api/heroes?page={i % 50 + 1}", None)),
+        Route('heroes cursor by name', 'GET', '/api/heroes',
+              fixed('/api/heroes?sort=name&cursor=&per_page=50')),
+        Route('heroes search', 'GET', '/api/heroes', fixed('/api/heroes?search=phoenix')),
+        Route('heroes fields', 'GET', '/api/heroes', fixed('/api/heroes?fields=id,name&per_page=100')),
+        Route('heroes with counts', 'GET', '/api/heroes',
+              fixed('/api/heroes?counts=power_count,strong_count&per_page=100')),
+        Route('heroes by power count', 'GET', '/api/heroes',
+              fixed('/api/heroes?sort=-power_count&cursor=&per_page=50')),
+        Route('heroes by ids (50)', 'GET', '/api/heroes',
+              lambda i, state: ("/api/heroes?ids="
+                                + ','.join(str((i * 50 + k) * 7919 % heroes + 1) for k in range(50)), None)),
+        Route('heroes by ids with powers (50)', 'GET', '/api/heroes',
+              lambda i, state: ("/api/heroes?include_powers=true&ids="
+                                + ','.join(str((i * 50 + k) * 7919 % heroes + 1) for k in range(50)), None)),
+        Route('hero detail', 'GET', '/api/heroes/<int:id>',
+              lambda i, state: (f"/api/heroes/{i * 7919 % heroes + 1}", None)),
+        Route('create hero', 'POST', '/api/heroes',
+              lambda i, state: ('/api/heroes', {'name': f'Bench {i}', 'super_name': f"Bench {state['run']} {i}"})),
+        Route('bulk heroes (100)', 'POST', '/api/heroes/bulk',
+              lambda i, state: ('/api/heroes/bulk', [
+                  {'name': f'Bulk {i}-{n}', 'super_name': f"Bulk {state['run']} {i}-{n}"} for n in range(100)
+              ])),
+        Route('update hero', 'PATCH', '/api/heroes/<int:id>',
+              lambda i, state: (f"/api/heroes/{i % heroes + 1}", {'name': f'Renamed {i}'})),
+        Route('powers page', 'GET', '/api/powers', lambda i, state: (f"/api/powers?page={i % 5 + 1}", None)),
+        Route('powers by hero count', 'GET', '/api/powers', fixed('/api/powers?sort=-hero_count&counts=strong_count')),
+        Route('powers by ids', 'GET', '/api/powers',
+              lambda i, state: ("/api/powers?ids=" + ','.join(str((i + k) % powers + 1) for k in range(10)), None)),
+        Route('power detail', 'GET', '/api/powers/<int:id>',
+              lambda i, state: (f"/api/powers/{i % powers + 1}", None)),
+        Route('power detail with heroes', 'GET', '/api/powers/<int:id>',
+              lambda i, state: (f"/api/powers/{i % powers + 1}?include_heroes=true", None), heavy=True),
+        Route('create power', 'POST', '/api/powers',
+              lambda i, state: ('/api/powers', {'name': f"Bench {state['run']} {i}", 'description': 'Power created by the benchmark'})),
+        Route('bulk powers (100)', 'POST', '/api/powers/bulk',
+              lambda i, state: ('/api/powers/bulk', [
+                  {'name': f"Bulk {state['run']} {i}-{n}", 'description': 'Power created by the benchmark'} for n in range(100)
+              ])),
+        Route('update power', 'PATCH', '/api/powers/<int:id>',
+              lambda i, state: (f"/api/powers/{i % powers + 1}", {'description': f'Description updated by benchmark {i}'})),
+        Route('hero_powers page', 'GET', '/api/hero_powers',
+              lambda i, state: (f"/api/hero_powers?page={i % 50 + 1}", None)),
+        Route('hero_powers by hero', 'GET', '/api/hero_powers',
+              lambda i, state: (f"/api/hero_powers?hero_id={i * 7919 % heroes + 1}", None)),
+        Route('hero_powers by power', 'GET', '/api/hero_powers',
+              lambda i, state: (f"/api/hero_powers?power_id={i % powers + 1}", None)),
+        Route('assign power', 'POST', '/api/hero_powers',
+              lambda i, state: ('/api/hero_powers', {
+                  'hero_id': i * 7919 % heroes + 1, 'power_id': i % powers + 1, 'strength': 'Strong'
+              })),
+        Route('bulk assign (100)', 'POST', '/api/hero_powers/bulk',
+              lambda i, state: ('/api/hero_powers/bulk', [
+                  {'hero_id': (i * 100 + n) % heroes + 1, 'power_id': (i + n) % powers + 1, 'strength': 'Weak'}
+                  for n in range(100)
+              ])),
+        Route('update hero_power', 'PATCH', '/api/hero_powers/<int:id>',
+              lambda i, state: (f"/api/hero_powers/{i % links + 1}", {'strength': 'Average'})),
+        Route('strength levels', 'GET', '/api/strength_levels', fixed('/api/strength_levels')),
+        Route('stats', 'GET', '/api/stats', fixed('/api/stats')),
+        Route('export heroes ndjson', 'GET', '/api/export/<resource>', fixed('/api/export/heroes'), heavy=True),
+        Route('export hero_powers csv', 'GET', '/api/export/<resource>',
+              fixed('/api/export/hero_powers?format=csv'), heavy=True),
+        Route('replicas', 'GET', '/api/replicas', fixed('/api/replicas')),
+        Route('cache stats', 'GET', '/api/cache/stats', fixed('/api/cache/stats')),
+        Route('metrics', 'GET', '/api/metrics', fixed('/api/metrics')),
+        Route('graph heroes with all of', 'GET', '/api/graph/heroes',
+              lambda i, state: (f"/api/graph/heroes?all={i % powers + 1},{(i + 1) % powers + 1}", None)),
+        Route('graph similar heroes', 'GET', '/api/graph/heroes/<int:id>/similar',
+              lambda i, state: (f"/api/graph/heroes/{i * 7919 % heroes + 1}/similar?min_shared=2", None)),
+        Route('graph co-occurring powers', 'GET', '/api/graph/powers/<int:id>/co_occurring',
+              lambda i, state: (f"/api/graph/powers/{i % powers + 1}/co_occurring", None)),
+        Route('graph power ranking', 'GET', '/api/graph/powers/ranking', fixed('/api/graph/powers/ranking?strength=Strong')),
+        Route('changes feed', 'GET', '/api/changes', lambda i, state: (f"/api/changes?since={i * 50}", None)),
+        Route('send mail', 'POST', '/api/send_mail', fixed('/api/send_mail', mail), remember=remember_job),
+        Route('send mail batch (10)', 'POST', '/api/send_mail/batch', fixed('/api/send_mail/batch', [mail] * 10)),
+        Route('mail job status', 'GET', '/api/send_mail/<job_id>', job_url),
+        # Deletes last, from the top of each table, so earlier routes still find their rows
+        Route('delete hero_power', 'DELETE', '/api/hero_powers/<int:id>',
+              lambda i, state: (f"/api/hero_powers/{links - i}", None)),
+        Route('delete hero', 'DELETE', '/api/heroes/<int:id>',
+              lambda i, state: (f"/api/heroes/{heroes - i}", None)),
+        Route('delete power', 'DELETE', '/api/powers/<int:id>',
+              lambda i, state: (f"/api/powers/{powers - i}", None), heavy=True),
+    ]
+
+
+def powers_for(size):
+    return max(2 * MAX_HEAVY_REQUESTS, size // 1000)
+
+
+def benchmark_env(database_url, cache):
+    return {
+        'DATABASE_URL': database_url,
+        'DB_PROFILE': 'production',
+        'CACHE_BACKEND': 'memory' if cache else 'none',
+        # Mail is accepted and queued, then fails fast against a closed port
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': '9',
+        'MAIL_USE_TLS': 'false',
+        'MAIL_DEFAULT_SENDER': 'bench@example.com',
+        'MAIL_MAX_RETRIES': '0',
+    }
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(route, latencies, statuses, wall, queries=None):
+    ordered = sorted(latencies)
+    result = {
+        'route': route.label,
+        'method': route.method,
+        'rule': route.rule,
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status not in route.ok),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall > 0 else None,
+        'latency_ms': {
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+            'p99': round(percentile(ordered, 99) * 1000, 3),
+            'mean': round(statistics.mean(ordered) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3),
+        },
+    }
+    if queries is not None:
+        result['queries'] = {'mean': round(statistics.mean(queries), 2), 'max': max(queries)}
+    return result
+
+
+def request_count(route, requests):
+    return min(requests, MAX_HEAVY_REQUESTS) if route.heavy else requests
+
+
+def wait_for_graph(status, successes=1, timeout=600):
+    """Poll a graph route until ``successes`` answers in a row are not 503, so the build is not timed as errors"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < successes:
+        if status() == 503:
+            if time.monotonic() > deadline:
+                raise RuntimeError("the graph was not built in time")
+            streak = 0
+            time.sleep(0.1)
+        else:
+            streak += 1
+
+
+def run_client(database_url, size, requests, cache, run_id):
+    os.environ.update(benchmark_env(database_url, cache))
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    counter = {'queries': 0}
+
+    def count(*args):
+        counter['queries'] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+
+    client = app.test_client()
+    wait_for_graph(lambda: client.get(GRAPH_PROBE).status_code)
+    state = {'run': run_id}
+    results = []
+    try:
+        for route in routes_for(size):
+            latencies, statuses, queries = [], [], []
+            started = time.perf_counter()
+            for i in range(request_count(route, requests)):
+                url, body = route.make(i, state)
+                counter['queries'] = 0
+                sent = time.perf_counter()
+                response = client.open(url, method=route.method, json=body)
+                response.get_data()
+                latencies.append(time.perf_counter() - sent)
+                statuses.append(response.status_code)
+                queries.append(counter['queries'])
+                if route.remember and response.status_code in route.ok and response.is_json:
+                    route.remember(state, response.get_json())
+            results.append(summarize(route, latencies, statuses, time.perf_counter() - started, queries))
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+            engine.dispose()
+    return results
+
+
+def http_request(port, method, url, body):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        sent = time.perf_counter()
+        connection.request(method, url, body=payload, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        return time.perf_counter() - sent, response.status, data
+    finally:
+        connection.close()
+
+
+def wait_for_server(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1).read()
+            return
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                raise RuntimeError(f"server on port {port} did not start")
+            time.sleep(0.05)
+
+
+def run_gunicorn(database_url, size, requests, cache, workers, threads, concurrency, run_id):
+    port = free_port()
+    env = dict(os.environ, **benchmark_env(database_url, cache),
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads), GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_PRELOAD='true')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(port, server)
+        # Each worker builds its own graph and requests land on any of them
+        wait_for_graph(lambda: http_request(port, 'GET', GRAPH_PROBE, None)[1], successes=4 * workers)
+        state = {'run': f'{run_id}g'}
+        results = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for route in routes_for(size):
+                calls = [route.make(i, state) for i in range(request_count(route, requests))]
+                started = time.perf_counter()
+                responses = list(pool.map(lambda call: http_request(port, route.method, *call), calls))
+                wall = time.perf_counter() - started
+                if route.remember:
+                    for _, status, data in responses:
+                        if status in route.ok:
+                            route.remember(state, json.loads(data))
+                results.append(summarize(
+                    route, [latency for latency, _, _ in responses], [status for _, status, _ in responses], wall
+                ))
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def seed_template(path, size, seed):
+    subprocess.run(
+        [sys.executable, 'seed.py', '--heroes', str(size), '--powers', str(powers_for(size)),
+         '--links', str(3 * size), '--seed', str(seed)],
+        cwd=HERE, env=dict(os.environ, DATABASE_URL=f'sqlite:///{path}', DB_PROFILE='default'),
+        check=True, capture_output=True
+    )
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def unrouted_rules(size):
+    """URL rules of the app that no benchmark route exercises"""
+    from app import create_app
+    covered = {(route.method, route.rule) for route in routes_for(size)}
+    return sorted(
+        f"{method} {rule.rule}"
+        for rule in create_app().url_map.iter_rules() if rule.rule not in SKIPPED_RULES
+        for method in rule.methods - {'HEAD', 'OPTIONS'} if (method, rule.rule) not in covered
+    )
+
+
+def compare(base_path, results, threshold):
+    with open(base_path) as f:
+        base = {(r['size'], r['mode'], r['route']): r for r in json.load(f)['results']}
+
+    print(f"\nCompared with {base_path} (p95 and throughput; changes beyond {threshold:.0%} are flagged)")
+    regressions = 0
+    for result in results:
+        before = base.get((result['size'], result['mode'], result['route']))
+        if before is None:
+            continue
+        p95_change = result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1 if before['latency_ms']['p95'] else 0
+        flag = ''
+        if p95_change > threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif p95_change < -threshold:
+            flag = 'improved'
+        print(f"  {result['size']:>8} {result['mode']:<8} {result['route']:<28} "
+              f"p95 {before['latency_ms']['p95']:>9.2f} -> {result['latency_ms']['p95']:>9.2f} ms "
+              f"({p95_change:+.0%})  {flag}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'size':>8} {'mode':<8} {'route':<28} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>7} {'errors':>6}")
+    for r in results:
+        queries = r.get('queries', {}).get('mean', '')
+        print(f"{r['size']:>8} {r['mode']:<8} {r['route']:<28} {r['throughput_rps']:>8} "
+              f"{r['latency_ms']['p50']:>8.2f} {r['latency_ms']['p95']:>8.2f} {r['latency_ms']['p99']:>8.2f} "
+              f"{queries:>7} {r['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000', help="comma-separated hero counts; links are 3 per hero")
+    parser.add_argument('--requests', type=int, default=100, help="requests per route (heavy routes use fewer)")
+    parser.add_argument('--modes', default='client,gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument('--concurrency', type=int, default=8, help="parallel requests against gunicorn")
+    parser.add_argument('--cache', action='store_true', help="keep the response cache on")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON results path (default: benchmark-<commit>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to diff against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative p95 change reported by --compare")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    commit = git_commit()
+    run_id = int(time.time())
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            template = os.path.join(directory, f'template-{size}.db')
+            print(f"Seeding {size} heroes...", file=sys.stderr)
+            seed_template(template, size, args.seed)
+
+            for mode in modes:
+                database = os.path.join(directory, f'{mode}-{size}.db')
+                shutil.copyfile(template, database)
+                print(f"Running {mode} against {size} heroes...", file=sys.stderr)
+                if mode == 'client':
+                    rows = run_client(f'sqlite:///{database}', size, args.requests, args.cache, run_id)
+                elif mode == 'gunicorn':
+                    rows = run_gunicorn(f'sqlite:///{database}', size, args.requests, args.cache,
+                                        args.workers, args.threads, args.concurrency, run_id)
+                else:
+                    parser.error(f"Unknown mode: {mode}")
+                results.extend(dict(row, size=size, mode=mode) for row in rows)
+
+        missing = unrouted_rules(sizes[0])
+
+    output = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'args': vars(args),
+            'unbenchmarked_rules': missing,
+        },
+        'results': results,
+    }
+    path = args.output or f'benchmark-{commit}.json'
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    print_results(results)
+    if missing:
+        print(f"\nRoutes without a benchmark: {', '.join(missing)}")
+    print(f"\nWrote {path}")
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Response cache for the read endpoints.
+
+Cached responses carry tags such as ``heroes`` (the hero list) or
+``hero:3`` (one hero's detail). Writes invalidate the tags they affect:
+ORM changes through SQLAlchemy session events once the transaction
+commits, and Core bulk upserts through ``models.bulk_write_listeners``.
+
+Those events only reach the process that made the write, so with several
+workers and the memory backend another worker may still hold the old
+entry. Entries are therefore stored under the ETag the ``conditional``
+validators computed for them, and served only while the current request
+computes the same one. The validators read table versions and rows that
+every worker shares, so a stale entry is never served. It is replaced on
+the next miss instead.
+
+Clients holding the replica sticky cookie bypass the cache, so they read
+their own writes from the primary. Responses read from a replica expire
+after ``CACHE_REPLICA_TTL`` seconds instead of ``CACHE_TTL``.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Hero, Power, HeroPower, bulk_write_listeners
+from replicas import STICKY_COOKIE
+
+
+def tags_for(model, row):
+    """Cache tags made stale by a write to one row of ``model``"""
+    if model is Hero:
+        return {'heroes', f'hero:{row.id}', 'hero_powers', 'stats'}
+    if model is Power:
+        return {'powers', f'power:{row.id}', 'hero_powers', 'stats'}
+    if model is HeroPower:
+        return {'hero_powers', f'hero:{row.hero_id}', f'power:{row.power_id}', 'stats'}
+    return set()
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL"""
+
+    name = 'memory'
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value, tags = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags, ttl=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            removed = 0
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Shared cache for several workers; entries and tag sets expire through Redis TTLs"""
+
+    name = 'redis'
+
+    def __init__(self, url, ttl=60, prefix='superheroes:cache:'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = None
+        self.expirations = None
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        entry = self._redis.hgetall(self.prefix + key)
+        if not entry:
+            return None
+        return entry[b'etag'].decode(), entry[b'body'], int(entry[b'status']), json.loads(entry[b'headers'])
+
+    def set(self, key, value, tags, ttl=None):
+        etag, body, status, headers = value
+        ttl = ttl or self.ttl
+        pipe = self._redis.pipeline()
+        pipe.hset(self.prefix + key, mapping={
+            'etag': etag, 'body': body, 'status': status, 'headers': json.dumps(headers)
+        })
+        pipe.expire(self.prefix + key, ttl)
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, key)
+            pipe.expire(self.prefix + 'tag:' + tag, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        removed = 0
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = [self.prefix + key.decode() for key in self._redis.smembers(tag_key)]
+            if keys:
+                removed += self._redis.delete(*keys)
+            self._redis.delete(tag_key)
+        return removed
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.prefix + '*'))
+        if keys:
+            self._redis.delete(*keys)
+
+    def size(self):
+        return None
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_TTL', 60)
+        app.config.setdefault('CACHE_MAXSIZE', 1024)
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        app.config.setdefault('CACHE_REPLICA_TTL', 5)
+        self.replica_ttl = app.config['CACHE_REPLICA_TTL']
+
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['CACHE_MAXSIZE'], app.config['CACHE_TTL'])
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], app.config['CACHE_TTL'])
+        elif backend in ('none', 'null', ''):
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+        if self.backend is not None:
+            self._listen()
+
+    def cached(self, tags):
+        """Cache successful responses of a GET view.
+
+        ``tags`` is either a list or a callable taking the view's keyword
+        arguments and the JSON payload and returning the entry's tags. The
+        view must sit below ``conditional`` and ``replicas.reads``; requests
+        without a ``g.etag`` or with the sticky cookie are not cached.
+        """
+        tag_function = tags if callable(tags) else (lambda view_args, payload: tags)
+
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                etag = g.get('etag')
+                if self.backend is None or etag is None or request.cookies.get(STICKY_COOKIE):
+                    return f(*args, **kwargs)
+
+                key = request.full_path
+                value = self.backend.get(key)
+                if value is not None and value[0] == etag:
+                    self._count('hits')
+                    _, body, status, headers = value
+                    return make_response(body, status, headers)
+
+                self._count('misses')
+                generation = self._generation
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and generation == self._generation:
+                    self.backend.set(
+                        key,
+                        (etag, response.get_data(), response.status_code, list(response.headers.items())),
+                        set(tag_function(kwargs, response.get_json())),
+                        self.replica_ttl if g.get('db_replica') is not None else None
+                    )
+                return response
+            return decorated_function
+        return decorator
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of ``tags``"""
+        with self._lock:
+            self._generation += 1
+        if self.backend is not None and tags:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": getattr(self.backend, 'evictions', None),
+            "expirations": getattr(self.backend, 'expirations', None),
+            "size": self.backend.size() if self.backend else None
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _listen(self):
+        """Collect tags while the transaction runs and invalidate them once it commits"""
+        def pending(session):
+            return session.info.setdefault('cache_tags', set())
+
+        @event.listens_for(Session, 'after_flush')
+        def collect_flushed(session, flush_context):
+            tags = pending(session)
+            for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+                tags.update(tags_for(type(instance), instance))
+
+        def collect_bulk(session, model, rows):
+            tags = pending(session)
+            for row in rows:
+                tags.update(tags_for(model, row))
+
+        bulk_write_listeners.append(collect_bulk)
+
+        @event.listens_for(Session, 'after_commit')
+        def invalidate_committed(session):
+            tags = session.info.pop('cache_tags', None)
+            if tags:
+                self.invalidate(*tags)
+
+        @event.listens_for(Session, 'after_soft_rollback')
+        def discard_rolled_back(session, previous_transaction):
+            session.info.pop('cache_tags', None)
+
+
+response_cache = ResponseCache()
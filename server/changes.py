@@ -0,0 +1,186 @@
+"""Change log behind /api/changes for incremental client sync.
+
+Every flushed insert, update and delete of a hero, power or hero_power
+appends a row to ``changes`` in the same transaction. That includes
+hero_powers removed by cascade from a deleted hero or power. Core bulk
+upserts are logged through ``models.bulk_write_listeners``. A change's
+``id`` is the sync token: ``changes`` uses AUTOINCREMENT, so tokens only
+grow. SQLite serializes write transactions, so they also commit in order.
+
+``compact_changes`` keeps only the latest change per row and can purge
+old tombstones. Purging raises the floor stored in ``stat_counters``. A
+client whose token is below the floor has missed deletes and must
+resync from the list endpoints.
+
+The same hooks bump the written tables' versions through ``versions.py``.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, func, delete, insert
+from sqlalchemy.orm import Session, object_session
+
+from models import Hero, Power, HeroPower, Change, StatCounter, bulk_write_listeners
+from serializers import HERO_PLAN, POWER_PLAN, HERO_POWER_PLAN, HERO_POWER_FIELDS
+from versions import touch_tables
+
+RESOURCES = {'heroes': Hero, 'powers': Power, 'hero_powers': HeroPower}
+PLANS = {'heroes': HERO_PLAN, 'powers': POWER_PLAN, 'hero_powers': HERO_POWER_PLAN.only(HERO_POWER_FIELDS)}
+FLOOR = 'changes_floor'
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+_resource_names = {model: name for name, model in RESOURCES.items()}
+
+
+class ResyncRequired(Exception):
+    """The client's token predates the change log; it must reload the lists"""
+
+
+def _pending(session):
+    return session.info.setdefault('pending_changes', [])
+
+
+def _record_insert(mapper, connection, target):
+    _pending(object_session(target)).append((_resource_names[type(target)], target.id, False))
+
+
+def _record_update(mapper, connection, target):
+    # after_update also fires for rows that were only touched through a relationship
+    session = object_session(target)
+    if session.is_modified(target, include_collections=False):
+        _pending(session).append((_resource_names[type(target)], target.id, False))
+
+
+def _record_delete(mapper, connection, target):
+    _pending(object_session(target)).append((_resource_names[type(target)], target.id, True))
+
+
+def _write_pending(session, flush_context):
+    pending = session.info.pop('pending_changes', None)
+    if pending:
+        now = datetime.utcnow()
+        session.execute(insert(Change), [
+            {'resource': resource, 'resource_id': resource_id, 'deleted': deleted, 'changed_at': now}
+            for resource, resource_id, deleted in pending
+        ])
+        touch_tables(session, sorted({resource for resource, _, _ in pending}))
+
+
+def _discard_pending(session, previous_transaction):
+    session.info.pop('pending_changes', None)
+
+
+def _record_bulk(session, model, rows):
+    now = datetime.utcnow()
+    session.execute(insert(Change), [
+        {'resource': _resource_names[model], 'resource_id': row.id, 'deleted': False, 'changed_at': now}
+        for row in rows
+    ])
+    touch_tables(session, [_resource_names[model]])
+
+
+def track_changes():
+    """Start logging writes; safe to call more than once"""
+    if event.contains(Session, 'after_flush', _write_pending):
+        return
+    for model in RESOURCES.values():
+        event.listen(model, 'after_insert', _record_insert)
+        event.listen(model, 'after_update', _record_update)
+        event.listen(model, 'after_delete', _record_delete)
+    event.listen(Session, 'after_flush', _write_pending)
+    event.listen(Session, 'after_soft_rollback', _discard_pending)
+    bulk_write_listeners.append(_record_bulk)
+
+
+def head_token(session):
+    return session.execute(select(func.coalesce(func.max(Change.id), 0))).scalar()
+
+
+def floor_token(session):
+    return session.execute(select(StatCounter.value).where(StatCounter.name == FLOOR)).scalar() or 0
+
+
+def log_bounds(session):
+    """``(floor, head)`` tokens of the change log in one round trip"""
+    floor, head = session.execute(select(
+        select(StatCounter.value).where(StatCounter.name == FLOOR).scalar_subquery(),
+        select(func.max(Change.id)).scalar_subquery()
+    )).one()
+    return floor or 0, head or 0
+
+
+def read_changes(session, since, limit):
+    """Changes after token ``since``, oldest first, with each surviving row's current data.
+
+    Returns ``(changes, next_token, has_more)``. A row changed several
+    times within the page appears once, at its latest token. A token
+    beyond the head was handed out by a database further ahead, e.g. the
+    primary while this is a lagging replica, so the page is empty and the
+    client keeps its token.
+    """
+    if since < floor_token(session):
+        raise ResyncRequired(f"Token {since} is no longer in the change log; reload the lists and restart from the current token")
+    if since > head_token(session):
+        return [], since, False
+
+    entries = session.execute(
+        select(Change.id, Change.resource, Change.resource_id, Change.deleted)
+        .where(Change.id > since)
+        .order_by(Change.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for token, resource, resource_id, deleted in entries:
+        latest.pop((resource, resource_id), None)
+        latest[(resource, resource_id)] = (token, deleted)
+
+    data = {}
+    for resource, plan in PLANS.items():
+        ids = [resource_id for (name, resource_id), (_, deleted) in latest.items() if name == resource and not deleted]
+        if ids:
+            model = RESOURCES[resource]
+            rows = session.execute(select(*plan.columns).where(model.id.in_(ids))).all()
+            data.update(((resource, item['id']), item) for item in plan.to_dicts(rows))
+
+    changes = []
+    for (resource, resource_id), (token, deleted) in latest.items():
+        item = None if deleted else data.get((resource, resource_id))
+        changes.append({
+            "token": token,
+            "resource": resource,
+            "id": resource_id,
+            # A row missing here was deleted by a change beyond this page
+            "deleted": item is None,
+            "data": item
+        })
+    next_token = entries[-1].id if entries else since
+    return changes, next_token, has_more
+
+
+def compact_changes(connection, tombstone_days=None):
+    """Drop superseded changes and, optionally, tombstones older than ``tombstone_days``.
+
+    Returns ``(superseded, purged, floor)``.
+    """
+    table = Change.__table__
+    latest = select(func.max(table.c.id)).group_by(table.c.resource, table.c.resource_id)
+    superseded = connection.execute(delete(table).where(table.c.id.not_in(latest))).rowcount
+
+    purged = 0
+    floor = connection.execute(select(StatCounter.value).where(StatCounter.name == FLOOR)).scalar() or 0
+    if tombstone_days is not None:
+        cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+        old = table.c.deleted.is_(True) & (table.c.changed_at < cutoff)
+        newest_purged = connection.execute(select(func.max(table.c.id)).where(old)).scalar()
+        if newest_purged is not None:
+            purged = connection.execute(delete(table).where(old)).rowcount
+            counters = StatCounter.__table__
+            if connection.execute(select(counters.c.name).where(counters.c.name == FLOOR)).first() is None:
+                connection.execute(counters.insert().values(name=FLOOR, value=newest_purged))
+            else:
+                connection.execute(counters.update().where(counters.c.name == FLOOR).values(value=max(floor, newest_purged)))
+            floor = max(floor, newest_purged)
+    return superseded, purged, floor
@@ -0,0 +1,160 @@
+"""Concurrency benchmark: requests/sec at many simultaneous connections.
+
+Seeds a synthetic database, then serves it with each server mode in turn:
+
+* ``sync``: gunicorn sync workers, one request per worker at a time
+* ``gthread``: gunicorn threaded workers (``GUNICORN_THREADS``)
+* ``asgi``: uvicorn serving ``asgi:app``; skipped unless uvicorn and
+  asgiref are installed
+
+An asyncio client keeps ``--concurrency`` connections busy with a mix of
+list pages, detail lookups and ``send_mail`` calls, and reports
+throughput, latency percentiles and failed or timed-out requests.
+
+    python concurrency_benchmark.py --concurrency 100,1000 --requests 5000
+"""
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import benchmark_env, percentile, seed_template, wait_for_server
+from startup_benchmark import free_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = ('sync', 'gthread', 'asgi')
+
+
+def request_mix(heroes):
+    mail = json.dumps({'to': 'bench@example.com', 'subject': 'Benchmark', 'body': 'Hello'})
+    for i in itertools.count():
+        yield 'GET', f'/api/heroes?page={i % 100 + 1}&per_page=100', None
+        yield 'GET', f'/api/heroes/{i * 7919 % heroes + 1}', None
+        yield 'GET', f'/api/hero_powers?hero_id={i * 104729 % heroes + 1}', None
+        if i % 4 == 0:
+            yield 'POST', '/api/send_mail', mail
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--no-access-log']
+        return command, {'ASGI_THREADS': str(threads)}
+    env = {'GUNICORN_BIND': f'127.0.0.1:{port}', 'WEB_CONCURRENCY': str(workers), 'GUNICORN_PRELOAD': 'true',
+           'GUNICORN_THREADS': str(threads if mode == 'gthread' else 1)}
+    return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], env
+
+
+def available(mode):
+    if mode == 'asgi':
+        return all(importlib.util.find_spec(name) for name in ('uvicorn', 'asgiref'))
+    return True
+
+
+async def send(port, method, path, body, timeout):
+    payload = body.encode() if body else b''
+    head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\nContent-Length: {len(payload)}\r\n'
+    if body:
+        head += 'Content-Type: application/json\r\n'
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(head.encode() + b'\r\n' + payload)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def drive(port, heroes, concurrency, total, timeout):
+    requests = itertools.islice(request_mix(heroes), total)
+    latencies, failures = [], []
+
+    async def connection():
+        for method, path, body in requests:
+            sent = time.perf_counter()
+            try:
+                status = await send(port, method, path, body, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+                failures.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - sent)
+            if status >= 300:
+                failures.append(str(status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return latencies, failures, time.perf_counter() - started
+
+
+def run(mode, database_url, heroes, levels, total, workers, threads, timeout):
+    port = free_port()
+    command, server_env = server_command(mode, port, workers, threads)
+    env = dict(os.environ, **benchmark_env(database_url, cache=False), **server_env)
+    server = subprocess.Popen(command, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(port, server)
+        results = []
+        for concurrency in levels:
+            latencies, failures, wall = asyncio.run(drive(port, heroes, concurrency, total, timeout))
+            ordered = sorted(latencies) or [0]
+            results.append({
+                'mode': mode,
+                'concurrency': concurrency,
+                'requests': total,
+                'failed': len(failures),
+                'failures': sorted(set(failures)),
+                'throughput_rps': round(len(latencies) / wall, 1),
+                'latency_ms': {p: round(percentile(ordered, p) * 1000, 1) for p in (50, 95, 99)},
+            })
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--concurrency', default='100,1000', help="comma-separated open connection counts")
+    parser.add_argument('--requests', type=int, default=3000, help="requests per concurrency level")
+    parser.add_argument('--heroes', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="threads per worker in gthread and asgi modes")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds before a request counts as failed")
+    parser.add_argument('--output', help="write results as JSON")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.join(directory, 'template.db')
+        seed_template(template, args.heroes, seed=42)
+        for mode in args.modes.split(','):
+            if not available(mode):
+                print(f"Skipping {mode}: uvicorn and asgiref are not installed", file=sys.stderr)
+                continue
+            database = os.path.join(directory, f'{mode}.db')
+            shutil.copyfile(template, database)
+            print(f"Running {mode}...", file=sys.stderr)
+            results += run(mode, f'sqlite:///{database}', args.heroes, levels, args.requests,
+                           args.workers, args.threads, args.timeout)
+
+    print(f"{'mode':<8} {'connections':>11} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'failed':>7}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['concurrency']:>11} {r['throughput_rps']:>8} {r['latency_ms'][50]:>9} "
+              f"{r['latency_ms'][95]:>9} {r['latency_ms'][99]:>9} {r['failed']:>7}  {' '.join(r['failures'])}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
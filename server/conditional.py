@@ -0,0 +1,61 @@
+"""Conditional GET support driven by row aggregates and table versions"""
+import hashlib
+import time
+from datetime import timezone
+from functools import wraps
+
+from flask import g, request, make_response
+from werkzeug.http import is_resource_modified, quote_etag
+
+
+def make_validators(*parts, modified=()):
+    """Strong ETag and Last-Modified from the values a representation depends on.
+
+    ``parts`` are cheap values such as table versions or a row's
+    ``(updated_at, count)``; the request path and query string are mixed in
+    because they select what the body contains. Last-Modified is the latest
+    of ``modified``, the write times of the tables the body reads. A row's
+    own ``updated_at`` would not do: deleting a row does not move it.
+    """
+    digest = hashlib.sha1(request.full_path.encode())
+    for part in parts:
+        digest.update(repr(part).encode())
+
+    timestamps = [timestamp for timestamp in modified if timestamp is not None]
+    last_modified = max(timestamps).replace(tzinfo=timezone.utc) if timestamps else None
+    if last_modified is not None and last_modified.timestamp() >= int(time.time()):
+        # HTTP dates have whole seconds, so a second write within this second would not move it
+        last_modified = None
+    return quote_etag(digest.hexdigest()), last_modified
+
+
+def conditional(validators):
+    """Answer ``If-None-Match``/``If-Modified-Since`` with 304 before the view runs.
+
+    ``validators`` receives the view's keyword arguments and returns
+    ``(etag, last_modified)``, or ``None`` when the resource does not exist
+    so the view can produce its usual error. The ETag is left in ``g.etag``
+    for the response cache, which keys its entries on it.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            result = validators(kwargs)
+            if result is None:
+                return f(*args, **kwargs)
+
+            etag, last_modified = result
+            g.etag = etag
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,52 @@
+"""Streaming NDJSON/CSV export of whole tables.
+
+Rows are read as plain column tuples through a server-side cursor
+(``yield_per``) and written out one batch at a time, so memory use does
+not grow with the size of the table.
+"""
+import csv
+import enum
+import io
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import Hero, Power, HeroPower
+from serializers import dumps
+
+EXPORT_MODELS = {'heroes': Hero, 'powers': Power, 'hero_powers': HeroPower}
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_BATCH_SIZE = 1000
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def export_rows(session, model, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield ``model``'s table as NDJSON bytes or CSV text, one chunk per batch of rows"""
+    columns = list(model.__table__.columns)
+    keys = [column.key for column in columns]
+    result = session.execute(
+        select(*columns).order_by(model.__table__.c.id).execution_options(yield_per=batch_size)
+    )
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(keys)
+        for rows in result.partitions():
+            writer.writerows([[_plain(value) for value in row] for row in rows])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    for rows in result.partitions():
+        yield b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in rows)
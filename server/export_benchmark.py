@@ -0,0 +1,122 @@
+"""Export benchmark: rows/sec and peak worker RSS while streaming hero_powers.
+
+Seeds a synthetic database for each size, boots one gunicorn worker and
+streams ``/api/export/hero_powers`` in each format to the end, counting
+rows as they arrive. The worker's RSS is read before the export and its
+peak (``VmHWM``) after it. Anonymous memory is sampled while the response
+streams: a flat peak across sizes shows the export does not hold the
+table in memory. File-backed RSS grows with the pages SQLite maps
+(``mmap_size`` in the production profile) and is bounded by that setting.
+Linux only.
+
+    python export_benchmark.py --links 100000,1000000
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import wait_for_server
+from startup_benchmark import HERE, free_port, children
+
+
+def status_kb(pid):
+    """The ``/proc/<pid>/status`` memory fields (``VmRSS``, ``VmHWM``, ``RssAnon``...) in KiB"""
+    values = {}
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            key, _, rest = line.partition(':')
+            if rest.endswith('kB\n'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def get(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    connection.request('GET', path)
+    return connection, connection.getresponse()
+
+
+def export(env, fmt, chunk_size=65536):
+    port = free_port()
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=HERE, env=dict(env, GUNICORN_BIND=f'127.0.0.1:{port}'),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_server(port, master)
+        worker, = children(master.pid)
+        rss_before = status_kb(worker)['VmRSS']
+        peak_anon = peak_file = 0
+        started = time.perf_counter()
+        connection, response = get(port, f'/api/export/hero_powers?format={fmt}')
+        if response.status != 200:
+            raise RuntimeError(f"export answered {response.status}")
+        rows = size = 0
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            rows += chunk.count(b'\n')
+            size += len(chunk)
+            memory = status_kb(worker)
+            peak_anon = max(peak_anon, memory['RssAnon'])
+            peak_file = max(peak_file, memory['RssFile'])
+        elapsed = time.perf_counter() - started
+        connection.close()
+        peak = status_kb(worker)['VmHWM']
+    finally:
+        master.terminate()
+        master.wait()
+
+    if fmt == 'csv':
+        rows -= 1
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed,
+        'mb': size / 1e6,
+        'rss_before_mb': rss_before / 1024,
+        'peak_rss_mb': peak / 1024,
+        'peak_anon_mb': peak_anon / 1024,
+        'peak_file_mb': peak_file / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', default='1000000', help="comma separated hero_powers counts")
+    parser.add_argument('--formats', default='ndjson,csv')
+    args = parser.parse_args()
+
+    print(f"{'hero_powers':>11} {'format':<7} {'MB':>7} {'seconds':>8} {'rows/s':>9} {'RSS before':>11} {'peak RSS':>9} {'anon':>9} {'file':>9}")
+    for links in [int(links) for links in args.links.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'export.db')}",
+                WEB_CONCURRENCY='1', GUNICORN_THREADS='1', DB_PROFILE='production',
+                CACHE_BACKEND='none', GRAPH_BUILD_ON_START='false'
+            )
+            print(f"Seeding {links} hero_powers...", file=sys.stderr)
+            subprocess.run(
+                [sys.executable, 'seed.py', '--heroes', str(links // 3 + 1), '--powers', '100', '--links', str(links)],
+                cwd=HERE, env=dict(env, DB_PROFILE='default'), check=True, capture_output=True
+            )
+
+            for fmt in args.formats.split(','):
+                result = export(env, fmt)
+                if result['rows'] != links:
+                    print(f"{fmt} export returned {result['rows']} rows, expected {links}", file=sys.stderr)
+                print(
+                    f"{links:>11} {fmt:<7} {result['mb']:>7.1f} {result['seconds']:>8.1f} {result['rows_per_sec']:>9.0f} "
+                    f"{result['rss_before_mb']:>8.1f} MB {result['peak_rss_mb']:>6.1f} MB "
+                    f"{result['peak_anon_mb']:>6.1f} MB {result['peak_file_mb']:>6.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
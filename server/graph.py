@@ -0,0 +1,335 @@
+"""In-process hero↔power graph for relationship queries.
+
+Each power keeps one bitset of its holders per strength level. Each
+bitset is a Python int whose bit ``n`` is set when hero ``n`` holds the
+power. Set operations are then single big-int ``&``/``|`` operations.
+``counts`` keeps each power's number of holders per level, so rankings
+need no popcounts. ``hero_powers`` maps each hero to a
+bitset of its power ids, and ``links`` holds every hero_power by id. With
+``links`` a tombstone can be undone without knowing which hero and power
+the deleted row joined.
+
+The graph is built from ``hero_powers`` in one query, in a background
+thread started when the worker boots; until it finishes the graph is not
+``ready``. Before answering, it applies whatever the ``changes`` log
+recorded since the last token it saw. Writes from any gunicorn worker
+therefore show up in every worker's copy at the cost of one indexed
+lookup per query. The log is always read from the primary, so a lagging
+replica never moves the token backwards. If the log was compacted past
+that token, or the database was reset, the graph is rebuilt in the
+background.
+"""
+import logging
+import threading
+from array import array
+
+from flask import current_app
+from sqlalchemy import select, func
+
+from models import HeroPower, Change, StrengthLevel
+from changes import log_bounds
+
+STRENGTHS = list(StrengthLevel)
+STRENGTH_INDEX = {level: index for index, level in enumerate(STRENGTHS)}
+STORED_STRENGTH_INDEX = {level.name: index for index, level in enumerate(STRENGTHS)}
+NO_LINK = -1
+LOOKUP_CHUNK = 500
+BUILD_BATCH = 100000
+
+logger = logging.getLogger(__name__)
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+NONZERO = bytes([0] + [1] * 255)
+
+
+def bit_ids(bits, offset=0, limit=None):
+    """Positions of the set bits of ``bits`` in ascending order.
+
+    ``bin()`` would build a string of every bit. Instead the bytes are mapped
+    to 0/1 so ``find`` can jump between non-zero bytes in C.
+    """
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    marks = data.translate(NONZERO)
+    ids = []
+    position = marks.find(1)
+    while position != -1:
+        for bit in BYTE_BITS[data[position]]:
+            if offset:
+                offset -= 1
+                continue
+            if limit is not None and len(ids) >= limit:
+                return ids
+            ids.append(position * 8 + bit)
+        position = marks.find(1, position + 1)
+    return ids
+
+
+def pack(hero_id, power_id, strength):
+    return (hero_id << 34) | (power_id << 2) | STRENGTH_INDEX[strength]
+
+
+def unpack(value):
+    return value >> 34, (value >> 2) & 0xFFFFFFFF, STRENGTHS[value & 3]
+
+
+class PowerGraph:
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.token = None
+        self.by_strength = {}
+        self.holders = {}
+        self.counts = {}
+        self.hero_powers = {}
+        self.links = array('q')
+        self._lock = threading.Lock()
+        self._builder = None
+
+    def init_app(self, app, db):
+        app.config.setdefault('GRAPH_BUILD_ON_START', True)
+        with app.app_context():
+            self.engine = db.engine
+        # Started by the first request rather than here, so CLI commands that never serve do not build it
+        app.before_request(self._start_once)
+
+    @property
+    def ready(self):
+        return self.token is not None
+
+    # Maintenance
+
+    def start(self):
+        """Build the graph in a background thread unless it is built or already being built"""
+        with self._lock:
+            if not self.ready:
+                self._start_builder()
+
+    def _start_once(self):
+        if self._builder is None and current_app.config['GRAPH_BUILD_ON_START']:
+            self.start()
+
+    def _start_builder(self):
+        # Callers hold the lock
+        if self._builder is None or not self._builder.is_alive():
+            self._builder = threading.Thread(target=self._build, name='power-graph-build', daemon=True)
+            self._builder.start()
+
+    def _build(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Building the power graph failed; the next graph query retries")
+
+    def rebuild(self):
+        """Load every hero_power, then resume from the change log's current head.
+
+        Queries keep using the previous graph, if any, until the new one is swapped in.
+        """
+        buffers = {}
+        hero_powers = {}
+        loaded = 0
+        with self.engine.connect() as connection:
+            # A purge can leave the floor above the last surviving change; the rows already reflect it
+            token = max(log_bounds(connection))
+            # One max per subquery, so each is a single index probe
+            max_hero, max_link = connection.execute(select(
+                select(func.max(HeroPower.hero_id)).scalar_subquery(), select(func.max(HeroPower.id)).scalar_subquery()
+            )).one()
+            max_hero, max_link = max_hero or 0, max_link or 0
+            links = array('q', [NO_LINK]) * (max_link + 1)
+            # Millions of rows: skip Row objects and enum conversion and read the stored names in batches
+            statement = select(HeroPower.id, HeroPower.hero_id, HeroPower.power_id, HeroPower.strength)
+            cursor = connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(str(statement.compile(connection)))
+                rows = cursor.fetchmany(BUILD_BATCH)
+                while rows:
+                    for link_id, hero_id, power_id, strength in rows:
+                        strength = STORED_STRENGTH_INDEX[strength]
+                        key = (power_id, strength)
+                        buffer = buffers.get(key)
+                        if buffer is None:
+                            buffer = buffers[key] = bytearray(max_hero // 8 + 1)
+                        buffer[hero_id >> 3] |= 1 << (hero_id & 7)
+                        hero_powers[hero_id] = hero_powers.get(hero_id, 0) | (1 << power_id)
+                        links[link_id] = (hero_id << 34) | (power_id << 2) | strength
+                    loaded += len(rows)
+                    rows = cursor.fetchmany(BUILD_BATCH)
+            finally:
+                cursor.close()
+
+        by_strength = {}
+        for (power_id, strength), buffer in buffers.items():
+            by_strength.setdefault(power_id, [0] * len(STRENGTHS))[strength] = int.from_bytes(buffer, 'little')
+        holders = {power_id: _union(bitsets) for power_id, bitsets in by_strength.items()}
+        counts = {power_id: [popcount(bits) for bits in bitsets] for power_id, bitsets in by_strength.items()}
+
+        with self._lock:
+            self.by_strength, self.holders, self.counts = by_strength, holders, counts
+            self.hero_powers, self.links = hero_powers, links
+            self.token = token
+        logger.info(f"Power graph built from {loaded} hero_powers at token {token}")
+
+    def refresh(self):
+        """Apply logged hero_power writes since the last token.
+
+        When the log cannot bridge the gap the graph stops being ``ready``
+        and is rebuilt in the background.
+        """
+        with self._lock, self.engine.connect() as connection:
+            if self.token is None:
+                return
+            floor, head = log_bounds(connection)
+            head = max(head, floor)
+            if head < self.token or self.token < floor:
+                logger.warning(f"Change log cannot bridge token {self.token} to {head}; rebuilding the power graph")
+                self.token = None
+                self._start_builder()
+                return
+            if head == self.token:
+                return
+
+            changed = connection.execute(
+                select(Change.resource_id)
+                .where(Change.id > self.token, Change.id <= head, Change.resource == 'hero_powers')
+            ).scalars().all()
+            current = {}
+            ids = sorted(set(changed))
+            for start in range(0, len(ids), LOOKUP_CHUNK):
+                current.update(
+                    (row.id, row) for row in connection.execute(
+                        select(HeroPower.id, HeroPower.hero_id, HeroPower.power_id, HeroPower.strength)
+                        .where(HeroPower.id.in_(ids[start:start + LOOKUP_CHUNK]))
+                    )
+                )
+            for link_id in ids:
+                self._unlink(link_id)
+                row = current.get(link_id)
+                if row is not None:
+                    self._link(row.id, row.hero_id, row.power_id, row.strength)
+            self.token = head
+
+    def _link(self, link_id, hero_id, power_id, strength):
+        if link_id >= len(self.links):
+            self.links.extend([NO_LINK] * (link_id + 1 - len(self.links)))
+        self.links[link_id] = pack(hero_id, power_id, strength)
+        bit = 1 << hero_id
+        bitsets = self.by_strength.setdefault(power_id, [0] * len(STRENGTHS))
+        bitsets[STRENGTH_INDEX[strength]] |= bit
+        self.counts.setdefault(power_id, [0] * len(STRENGTHS))[STRENGTH_INDEX[strength]] += 1
+        self.holders[power_id] = self.holders.get(power_id, 0) | bit
+        self.hero_powers[hero_id] = self.hero_powers.get(hero_id, 0) | (1 << power_id)
+
+    def _unlink(self, link_id):
+        if link_id >= len(self.links) or self.links[link_id] == NO_LINK:
+            return
+        hero_id, power_id, strength = unpack(self.links[link_id])
+        self.links[link_id] = NO_LINK
+        bit = 1 << hero_id
+        bitsets = self.by_strength[power_id]
+        bitsets[STRENGTH_INDEX[strength]] &= ~bit
+        self.counts[power_id][STRENGTH_INDEX[strength]] -= 1
+        self.holders[power_id] = _union(bitsets)
+        remaining = self.hero_powers.get(hero_id, 0) & ~(1 << power_id)
+        if remaining:
+            self.hero_powers[hero_id] = remaining
+        else:
+            self.hero_powers.pop(hero_id, None)
+
+    # Queries; callers refresh first
+
+    def holders_of(self, power_id, strength=None):
+        if strength is None:
+            return self.holders.get(power_id, 0)
+        return self.by_strength.get(power_id, [0] * len(STRENGTHS))[STRENGTH_INDEX[strength]]
+
+    def heroes_matching(self, all_of=(), any_of=(), none_of=(), strength=None):
+        """Bitset of heroes holding every power in ``all_of``, one of ``any_of`` and none of ``none_of``.
+
+        ``strength`` restricts ``all_of`` and ``any_of`` to holders at that level.
+        """
+        with self._lock:
+            if all_of:
+                result = self.holders_of(all_of[0], strength)
+                for power_id in all_of[1:]:
+                    result &= self.holders_of(power_id, strength)
+            else:
+                result = _union(self.holders_of(power_id, strength) for power_id in any_of or self.holders)
+                any_of = ()
+            if any_of:
+                result &= _union(self.holders_of(power_id, strength) for power_id in any_of)
+            for power_id in none_of:
+                result &= ~self.holders_of(power_id)
+            return result
+
+    def similar_heroes(self, hero_id, min_shared=1, limit=20):
+        """Heroes sharing at least ``min_shared`` powers with ``hero_id``, most shared first.
+
+        Returns ``[(hero_id, shared, jaccard)]``. Shared counts are summed
+        with bitwise adders over the powers' holder bitsets, one bitset per
+        binary digit, so no per-hero loop runs until the results are read.
+        """
+        with self._lock:
+            own = self.hero_powers.get(hero_id, 0)
+            power_ids = bit_ids(own)
+            digits = []
+            for power_id in power_ids:
+                carry = self.holders.get(power_id, 0)
+                for index, digit in enumerate(digits):
+                    digits[index], carry = digit ^ carry, digit & carry
+                    if not carry:
+                        break
+                if carry:
+                    digits.append(carry)
+
+            everyone = _union(digits)
+            results = []
+            for shared in range(len(power_ids), max(min_shared, 1) - 1, -1):
+                exact = everyone & ~(1 << hero_id)
+                for index, digit in enumerate(digits):
+                    exact &= digit if shared >> index & 1 else ~digit
+                for other in bit_ids(exact, limit=limit - len(results)):
+                    union = popcount(own | self.hero_powers.get(other, 0))
+                    results.append((other, shared, round(shared / union, 4)))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def co_occurring(self, power_id, limit=20):
+        """Other powers ranked by how many heroes hold them together with ``power_id``"""
+        with self._lock:
+            base = self.holders.get(power_id, 0)
+            counts = [
+                (other, popcount(base & bits)) for other, bits in self.holders.items() if other != power_id
+            ]
+        counts = [item for item in counts if item[1]]
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts[:limit]
+
+    def power_ranking(self, strength=None, limit=20):
+        """Powers ranked by number of holders, optionally at one strength level"""
+        with self._lock:
+            if strength is None:
+                counts = [(power_id, sum(levels)) for power_id, levels in self.counts.items()]
+            else:
+                index = STRENGTH_INDEX[strength]
+                counts = [(power_id, levels[index]) for power_id, levels in self.counts.items()]
+        counts = [item for item in counts if item[1]]
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts[:limit]
+
+
+def _union(bitsets):
+    result = 0
+    for bits in bitsets:
+        result |= bits
+    return result
+
+
+power_graph = PowerGraph()
@@ -0,0 +1,120 @@
+"""Benchmark for the in-memory hero↔power graph at 100k heroes.
+
+Seeds a synthetic database, builds the graph and times each relationship
+query against the SQL a client would otherwise need. It also reports the
+build time, the size of the bitsets and the cost of catching up on writes.
+
+    python graph_benchmark.py --heroes 100000 --powers 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import select, func, text
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed(function, runs):
+    """Median microseconds per call"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--heroes', type=int, default=100000)
+    parser.add_argument('--powers', type=int, default=100)
+    parser.add_argument('--links', type=int, help="defaults to 3 per hero")
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'graph.db')}"
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    os.environ.setdefault('INSTRUMENTATION_ENABLED', 'false')
+    os.environ.setdefault('GRAPH_BUILD_ON_START', 'false')
+
+    from app import create_app
+    from graph import PowerGraph, bit_ids
+    from models import db, HeroPower, StrengthLevel
+    import seed
+
+    app = create_app()
+    with app.app_context():
+        print(f"Seeding {args.heroes} heroes...", file=sys.stderr)
+        seed.seed_synthetic(args.heroes, args.powers, args.links or 3 * args.heroes)
+
+        graph = PowerGraph(db.engine)
+        started = time.perf_counter()
+        graph.rebuild()
+        build = time.perf_counter() - started
+        size = sum(sys.getsizeof(bits) for bitsets in graph.by_strength.values() for bits in bitsets) \
+            + sum(sys.getsizeof(bits) for bits in graph.holders.values())
+        print(f"Build: {build * 1000:.0f} ms for {len(graph.hero_powers)} heroes; "
+              f"power bitsets {size / 1e6:.1f} MB, links array {graph.links.itemsize * len(graph.links) / 1e6:.1f} MB")
+
+        rng = random.Random(1)
+        storm = rng.randint(1, args.heroes)
+        flight, telepathy = sorted(graph.holders, key=lambda power: -len(bin(graph.holders[power])))[:2]
+        strong = StrengthLevel.STRONG
+        hp = HeroPower.__table__
+        session = db.session
+
+        cases = [
+            ("heroes with all of two powers",
+             lambda: bit_ids(graph.heroes_matching([flight, telepathy]), limit=100),
+             lambda: session.execute(
+                 select(hp.c.hero_id).where(hp.c.power_id.in_([flight, telepathy]))
+                 .group_by(hp.c.hero_id).having(func.count() == 2).order_by(hp.c.hero_id).limit(100)
+             ).all()),
+            ("heroes sharing >= 2 powers with one",
+             lambda: graph.similar_heroes(storm, min_shared=2, limit=20),
+             lambda: session.execute(text(
+                 "SELECT other.hero_id, COUNT(*) AS shared FROM hero_powers AS mine "
+                 "JOIN hero_powers AS other ON other.power_id = mine.power_id AND other.hero_id != mine.hero_id "
+                 "WHERE mine.hero_id = :hero GROUP BY other.hero_id HAVING COUNT(*) >= 2 "
+                 "ORDER BY shared DESC, other.hero_id LIMIT 20"
+             ), {'hero': storm}).all()),
+            ("powers co-occurring with one",
+             lambda: graph.co_occurring(flight, limit=20),
+             lambda: session.execute(text(
+                 "SELECT other.power_id, COUNT(*) AS heroes FROM hero_powers AS mine "
+                 "JOIN hero_powers AS other ON other.hero_id = mine.hero_id AND other.power_id != mine.power_id "
+                 "WHERE mine.power_id = :power GROUP BY other.power_id ORDER BY heroes DESC LIMIT 20"
+             ), {'power': flight}).all()),
+            ("powers ranked by Strong holders",
+             lambda: graph.power_ranking(strong, limit=20),
+             lambda: session.execute(
+                 select(hp.c.power_id, func.count()).where(hp.c.strength == strong.name)
+                 .group_by(hp.c.power_id).order_by(func.count().desc()).limit(20)
+             ).all()),
+        ]
+
+        print(f"{'query':<38} {'graph us':>10} {'SQL us':>10} {'speedup':>8}")
+        for label, in_graph, in_sql in cases:
+            graph_us = timed(in_graph, args.runs)
+            sql_us = timed(in_sql, max(3, args.runs // 10))
+            print(f"{label:<38} {graph_us:>10.0f} {sql_us:>10.0f} {sql_us / graph_us:>7.0f}x")
+
+        session.rollback()
+        for i in range(100):
+            session.execute(text("INSERT INTO changes (resource, resource_id, deleted, changed_at) "
+                                 "VALUES ('hero_powers', :id, 0, CURRENT_TIMESTAMP)"), {'id': rng.randint(1, len(graph.links) - 1)})
+        session.commit()
+        started = time.perf_counter()
+        graph.refresh()
+        print(f"Catch up on 100 logged writes: {(time.perf_counter() - started) * 1000:.1f} ms; "
+              f"no-op refresh: {timed(graph.refresh, args.runs):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
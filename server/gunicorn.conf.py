@@ -0,0 +1,33 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py`
+
+GUNICORN_PRELOAD=true builds the app once in the master before forking,
+so workers share its imported code and boot faster. GUNICORN_THREADS above
+1 switches to the threaded worker, so one worker can serve that many
+requests at once instead of one.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+# The app starts the graph build on its first request, which a preloaded master never serves
+build_graph = os.environ.get('GRAPH_BUILD_ON_START', 'true').lower() == 'true'
+
+
+def post_fork(server, worker):
+    # A preloaded app's engines may hold connections opened in the master; never share them across processes
+    if server.cfg.preload_app:
+        from models import db
+        with server.app.wsgi().app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Start the graph build as each worker boots instead of on its first request
+    if build_graph:
+        from graph import power_graph
+        power_graph.start()
@@ -0,0 +1,262 @@
+"""Per-request SQL and timing instrumentation.
+
+SQLAlchemy cursor events time every statement, and Flask request hooks
+collect them per request. The database time, JSON encoding time and total
+time go out in a ``Server-Timing`` header. With ``SERVER_TIMING_SQL`` on,
+the header also carries the request's slowest statements. Totals per
+route and per statement are kept in process and rendered in Prometheus
+text format for ``/api/metrics``. Each gunicorn worker therefore reports
+only its own requests.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged. A request that runs
+the same SELECT ``N_PLUS_ONE_THRESHOLD`` times or more is logged as a
+likely N+1 query, which usually means a relationship loaded lazily inside
+a loop.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_STATEMENTS = 1000
+STATEMENT_LABEL_LENGTH = 200
+
+
+class RequestStats:
+    """What one request spent, collected in ``g.request_stats``"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.statements = []
+        self.selects = Counter()
+
+    def add(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.statements.append((elapsed, statement))
+        if statement.lstrip()[:6].upper() == 'SELECT':
+            self.selects[statement] += 1
+
+    def slowest(self, count):
+        return heapq.nlargest(count, self.statements, key=lambda item: item[0])
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = Counter()
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.n_plus_one = 0
+
+
+class Instrumentation:
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self._routes = {}
+        self._statements = {}
+        self._slow_queries = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', True)
+        app.config.setdefault('SLOW_QUERY_MS', 100)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('SERVER_TIMING_SQL', False)
+        app.config.setdefault('SERVER_TIMING_STATEMENTS', 3)
+
+        self.enabled = app.config['INSTRUMENTATION_ENABLED']
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        self.n_plus_one_threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        self.timing_sql = app.config['SERVER_TIMING_SQL']
+        self.timing_statements = app.config['SERVER_TIMING_STATEMENTS']
+        self._routes = {}
+        self._statements = {}
+        self._slow_queries = 0
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        self._time_json(app)
+
+    def _time_json(self, app):
+        """Count the time ``jsonify`` spends encoding towards the request's serialization time"""
+        encode = app.json.response
+
+        def response(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return encode(*args, **kwargs)
+            finally:
+                stats = g.get('request_stats') if has_request_context() else None
+                if stats is not None:
+                    stats.serialize_time += time.perf_counter() - started
+
+        app.json.response = response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if has_request_context():
+            stats = g.get('request_stats')
+            if stats is not None:
+                stats.add(statement, elapsed)
+
+        slow = elapsed >= self.slow_query_seconds
+        with self._lock:
+            totals = self._statements.get(statement)
+            if totals is None and len(self._statements) < MAX_STATEMENTS:
+                totals = self._statements[statement] = [0, 0.0, 0.0]
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+                totals[2] = max(totals[2], elapsed)
+            if slow:
+                self._slow_queries += 1
+        if slow:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {one_line(statement)}")
+
+    def _start_request(self):
+        g.request_stats = RequestStats()
+
+    def _finish_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        repeated = [(statement, count) for statement, count in stats.selects.items()
+                    if count >= self.n_plus_one_threshold]
+        for statement, count in repeated:
+            logger.warning(f"Possible N+1 query in {request.method} {route}: {count} executions of {one_line(statement)}")
+
+        with self._lock:
+            metrics = self._routes.get((request.method, route))
+            if metrics is None:
+                metrics = self._routes[(request.method, route)] = RouteMetrics()
+            metrics.requests[response.status_code] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    metrics.buckets[index] += 1
+            metrics.count += 1
+            metrics.duration += elapsed
+            metrics.queries += stats.queries
+            metrics.db_time += stats.db_time
+            metrics.serialize_time += stats.serialize_time
+            metrics.n_plus_one += len(repeated)
+
+        timings = [
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"',
+            f'serialize;dur={stats.serialize_time * 1000:.2f}',
+            f'total;dur={elapsed * 1000:.2f}',
+        ]
+        if self.timing_sql:
+            for index, (duration, statement) in enumerate(stats.slowest(self.timing_statements), 1):
+                timings.append(f'sql{index};dur={duration * 1000:.2f};desc="{header_text(statement)}"')
+        response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            statements = sorted(self._statements.items(), key=lambda item: item[1][1], reverse=True)[:20]
+            slow_queries = self._slow_queries
+
+        lines = [
+            '# HELP superheroes_http_requests_total Requests handled, by route and status.',
+            '# TYPE superheroes_http_requests_total counter',
+        ]
+        for (method, route), metrics in routes:
+            for status, count in sorted(metrics.requests.items()):
+                lines.append(f'superheroes_http_requests_total{labels(method=method, route=route, status=status)} {count}')
+
+        lines += [
+            '# HELP superheroes_http_request_duration_seconds Time from the first request hook to the response.',
+            '# TYPE superheroes_http_request_duration_seconds histogram',
+        ]
+        for (method, route), metrics in routes:
+            for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                lines.append(f'superheroes_http_request_duration_seconds_bucket{labels(method=method, route=route, le=bound)} {count}')
+            lines.append(f'superheroes_http_request_duration_seconds_bucket{labels(method=method, route=route, le="+Inf")} {metrics.count}')
+            lines.append(f'superheroes_http_request_duration_seconds_sum{labels(method=method, route=route)} {metrics.duration:.6f}')
+            lines.append(f'superheroes_http_request_duration_seconds_count{labels(method=method, route=route)} {metrics.count}')
+
+        for name, kind, description, value in (
+            ('db_queries_total', 'counter', 'SQL statements executed.', lambda m: m.queries),
+            ('db_duration_seconds_total', 'counter', 'Time spent executing SQL.', lambda m: f'{m.db_time:.6f}'),
+            ('serialize_duration_seconds_total', 'counter', 'Time spent encoding JSON.', lambda m: f'{m.serialize_time:.6f}'),
+            ('n_plus_one_total', 'counter', 'Requests that repeated one SELECT at least N_PLUS_ONE_THRESHOLD times.', lambda m: m.n_plus_one),
+        ):
+            lines += [f'# HELP superheroes_{name} {description}', f'# TYPE superheroes_{name} {kind}']
+            for (method, route), metrics in routes:
+                lines.append(f'superheroes_{name}{labels(method=method, route=route)} {value(metrics)}')
+
+        lines += [
+            '# HELP superheroes_slow_queries_total Statements slower than SLOW_QUERY_MS.',
+            '# TYPE superheroes_slow_queries_total counter',
+            f'superheroes_slow_queries_total {slow_queries}',
+            '# HELP superheroes_statement_duration_seconds_total Time per statement, for the 20 most expensive.',
+            '# TYPE superheroes_statement_duration_seconds_total counter',
+        ]
+        for statement, (count, total, _) in statements:
+            lines.append(f'superheroes_statement_duration_seconds_total{labels(statement=label_text(statement))} {total:.6f}')
+        lines += [
+            '# HELP superheroes_statement_executions_total Executions per statement, for the 20 most expensive.',
+            '# TYPE superheroes_statement_executions_total counter',
+        ]
+        for statement, (count, total, _) in statements:
+            lines.append(f'superheroes_statement_executions_total{labels(statement=label_text(statement))} {count}')
+        lines += [
+            '# HELP superheroes_statement_max_seconds Slowest execution per statement, for the 20 most expensive.',
+            '# TYPE superheroes_statement_max_seconds gauge',
+        ]
+        for statement, (count, total, slowest) in statements:
+            lines.append(f'superheroes_statement_max_seconds{labels(statement=label_text(statement))} {slowest:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def one_line(statement):
+    return ' '.join(statement.split())
+
+
+def label_text(statement):
+    return one_line(statement)[:STATEMENT_LABEL_LENGTH]
+
+
+def header_text(statement):
+    return label_text(statement)[:80].replace('\\', '\\\\').replace('"', '\\"')
+
+
+def labels(**values):
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in values.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+instrumentation = Instrumentation()
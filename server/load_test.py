@@ -0,0 +1,154 @@
+"""Concurrent read/write load test for the SQLite engine profiles.
+
+Runs each profile against its own fresh database file. Reader and writer
+processes stand in for gunicorn workers, and each one builds its own engine
+the way app.py does. Readers page through heroes and load a hero's powers.
+Writers insert heroes and re-assign power strengths in small transactions,
+so the search and stats triggers fire as in production. Prints operations
+per second and the number of "database is locked" failures per profile.
+
+    python load_test.py --seconds 10 --readers 4 --writers 2
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, update, insert, func
+from sqlalchemy.exc import OperationalError
+
+from models import db, Hero, Power, HeroPower, StrengthLevel
+from engine_profile import SQLITE_PRAGMAS, engine_options, sqlite_pragmas, install_pragmas
+from search import install_search
+from stats import install_counters
+
+SEED_HEROES = 2000
+SEED_POWERS = 50
+
+
+def make_engine(path, profile):
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'DB_PROFILE': profile}
+    # Match Flask-SQLAlchemy, which lets threads share pooled SQLite connections
+    engine = create_engine(
+        config['SQLALCHEMY_DATABASE_URI'],
+        connect_args={'check_same_thread': False},
+        **engine_options(config)
+    )
+    install_pragmas(engine, sqlite_pragmas(config))
+    return engine
+
+
+def prepare(path, profile):
+    engine = make_engine(path, profile)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        install_search(connection)
+        install_counters(connection)
+        connection.execute(insert(Hero), [
+            {'name': f'Hero {i}', 'super_name': f'Super {i}'} for i in range(SEED_HEROES)
+        ])
+        connection.execute(insert(Power), [
+            {'name': f'Power {i}', 'description': f'Description of power {i}'} for i in range(SEED_POWERS)
+        ])
+        connection.execute(insert(HeroPower), [
+            {'hero_id': hero_id, 'power_id': power_id, 'strength': random.choice(list(StrengthLevel))}
+            for hero_id in range(1, SEED_HEROES + 1)
+            for power_id in random.sample(range(1, SEED_POWERS + 1), 3)
+        ])
+    engine.dispose()
+
+
+def reader(path, profile, seconds, results):
+    engine = make_engine(path, profile)
+    deadline = time.monotonic() + seconds
+    ops = locked = 0
+    while time.monotonic() < deadline:
+        try:
+            with engine.connect() as connection:
+                offset = random.randrange(SEED_HEROES)
+                connection.execute(select(Hero).order_by(Hero.id).limit(20).offset(offset)).all()
+                connection.execute(
+                    select(HeroPower, Power.name).join(Power).where(HeroPower.hero_id == offset + 1)
+                ).all()
+                connection.execute(select(func.count(HeroPower.id))).scalar()
+            ops += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put(('read', ops, locked))
+
+
+def writer(path, profile, seconds, results):
+    engine = make_engine(path, profile)
+    deadline = time.monotonic() + seconds
+    ops = locked = 0
+    pid = os.getpid()
+    while time.monotonic() < deadline:
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Hero).values(name=f'Load {pid}-{ops}', super_name=f'Load {pid}-{ops}'))
+                connection.execute(
+                    update(HeroPower)
+                    .where(HeroPower.hero_id == random.randint(1, SEED_HEROES))
+                    .values(strength=random.choice(list(StrengthLevel)))
+                )
+            ops += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    results.put(('write', ops, locked))
+
+
+def run(profile, seconds, readers, writers):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'load.db')
+        prepare(path, profile)
+
+        results = multiprocessing.Queue()
+        processes = (
+            [multiprocessing.Process(target=reader, args=(path, profile, seconds, results)) for _ in range(readers)]
+            + [multiprocessing.Process(target=writer, args=(path, profile, seconds, results)) for _ in range(writers)]
+        )
+        for process in processes:
+            process.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in processes:
+            kind, ops, locked = results.get()
+            totals[kind][0] += ops
+            totals[kind][1] += locked
+        for process in processes:
+            process.join()
+
+    return {
+        kind: {'ops_per_sec': round(ops / seconds, 1), 'locked_errors': locked}
+        for kind, (ops, locked) in totals.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--profiles', default=','.join(SQLITE_PRAGMAS))
+    args = parser.parse_args()
+
+    # A fork after the first engine exists would share its connections, so spawn fresh interpreters
+    multiprocessing.set_start_method('spawn')
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile")
+    print(f"{'profile':<12} {'reads/s':>10} {'locked':>8} {'writes/s':>10} {'locked':>8}")
+    for profile in args.profiles.split(','):
+        result = run(profile, args.seconds, args.readers, args.writers)
+        print(
+            f"{profile:<12} {result['read']['ops_per_sec']:>10} {result['read']['locked_errors']:>8} "
+            f"{result['write']['ops_per_sec']:>10} {result['write']['locked_errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
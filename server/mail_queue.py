@@ -0,0 +1,220 @@
+"""Background delivery queue for outbound mail.
+
+``/api/send_mail`` stores each message as a ``mail_jobs`` row and returns
+straight away. A small pool of worker threads in every process polls the
+table for due jobs and claims one with a conditional UPDATE, so each job
+is sent once whichever gunicorn worker accepted it, and its status can be
+read from any worker. Each thread keeps its SMTP connection open between
+messages and closes it after ``MAIL_CONNECTION_IDLE`` seconds without
+work. A failed send is retried with exponential backoff by whichever
+thread polls next. A job left ``sending`` by a process that died is
+picked up again after ``MAIL_SENDING_TIMEOUT`` seconds. Flask-Mail is only
+imported and set up when the first message is queued.
+"""
+import logging
+import smtplib
+import threading
+import time
+import uuid
+
+from sqlalchemy import select, insert, update, delete, func
+
+from models import db, MailJob
+
+logger = logging.getLogger(__name__)
+
+CLAIM_CANDIDATES = 10
+
+
+def permanent_errors():
+    """Failures that will not go away by trying again"""
+    from flask_mail import BadHeaderError
+    return (BadHeaderError, AssertionError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+def message_data(message):
+    """The parts of a Flask-Mail ``Message`` needed to rebuild it in another process"""
+    return {
+        "subject": message.subject,
+        "sender": message.sender,
+        "recipients": list(message.recipients),
+        "body": message.body,
+        "html": message.html
+    }
+
+
+def build_message(data):
+    from flask_mail import Message
+    sender = data['sender']
+    return Message(
+        subject=data['subject'],
+        sender=tuple(sender) if isinstance(sender, list) else sender,
+        recipients=data['recipients'],
+        body=data['body'],
+        html=data['html']
+    )
+
+
+class MailQueue:
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self.mail = None
+        self._wake = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail=None):
+        app.config.setdefault('MAIL_QUEUE_WORKERS', 2)
+        app.config.setdefault('MAIL_MAX_RETRIES', 3)
+        app.config.setdefault('MAIL_RETRY_BACKOFF', 2.0)
+        app.config.setdefault('MAIL_CONNECTION_IDLE', 30.0)
+        app.config.setdefault('MAIL_JOB_RETENTION', 3600)
+        app.config.setdefault('MAIL_POLL_INTERVAL', 1.0)
+        app.config.setdefault('MAIL_SENDING_TIMEOUT', 300)
+        self.app = app
+        self.mail = mail
+
+    def submit(self, message):
+        """Store ``message`` as a queued job and return the job"""
+        with self._lock:
+            if self.mail is None:
+                from flask_mail import Mail
+                self.mail = Mail(self.app)
+        now = time.time()
+        job = MailJob(
+            id=uuid.uuid4().hex, status='queued', message=message_data(message), attempts=0,
+            run_at=now, created_at=now, updated_at=now
+        )
+        table = MailJob.__table__
+        with db.engine.begin() as connection:
+            self._prune(connection, now)
+            connection.execute(insert(table).values(
+                {column.name: getattr(job, column.name) for column in table.columns}
+            ))
+        self._start_workers()
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        return db.session.get(MailJob, job_id)
+
+    def _start_workers(self):
+        # Started on first use so forked gunicorn workers each get their own threads
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.app.config['MAIL_QUEUE_WORKERS']):
+                worker = threading.Thread(target=self._run, name=f'mail-worker-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _prune(self, connection, now):
+        table = MailJob.__table__
+        cutoff = now - self.app.config['MAIL_JOB_RETENTION']
+        connection.execute(delete(table).where(table.c.status.in_(('sent', 'failed')), table.c.updated_at < cutoff))
+
+    def _run(self):
+        with self.app.app_context():
+            connection = None
+            idle_since = time.monotonic()
+            while True:
+                try:
+                    job = self._claim()
+                    wait = None if job else self._seconds_until_due()
+                except Exception as e:
+                    logger.error(f"Could not read mail jobs: {e}")
+                    job, wait = None, self.app.config['MAIL_POLL_INTERVAL']
+                if job is None:
+                    if connection is not None and time.monotonic() - idle_since > self.app.config['MAIL_CONNECTION_IDLE']:
+                        connection = self._close(connection)
+                    # Woken early when this process queues a job; jobs from other processes wait for the poll
+                    if self._wake.wait(wait):
+                        self._wake.clear()
+                    continue
+
+                connection = self._deliver(job, connection)
+                idle_since = time.monotonic()
+
+    def _claim(self):
+        """Mark the oldest due job ``sending`` and return its row as a dict, or ``None`` when nothing is due.
+
+        The UPDATE only matches while the row still has the status and
+        attempt count it was read with, so of several threads or
+        processes racing for a job exactly one gets it.
+        """
+        table = MailJob.__table__
+        now = time.time()
+        due = select(table).where(
+            table.c.status.in_(('queued', 'retrying')), table.c.run_at <= now
+        ).order_by(table.c.run_at).limit(CLAIM_CANDIDATES)
+        abandoned = select(table).where(
+            table.c.status == 'sending', table.c.run_at <= now - self.app.config['MAIL_SENDING_TIMEOUT']
+        ).limit(CLAIM_CANDIDATES)
+        with db.engine.connect() as connection:
+            candidates = connection.execute(due).all() or connection.execute(abandoned).all()
+        for row in candidates:
+            with db.engine.begin() as connection:
+                claimed = connection.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.status == row.status, table.c.attempts == row.attempts)
+                    .values(status='sending', attempts=row.attempts + 1, run_at=now, updated_at=now)
+                ).rowcount
+            if claimed:
+                return dict(row._mapping, status='sending', attempts=row.attempts + 1)
+        return None
+
+    def _seconds_until_due(self):
+        """Time until the next queued or retrying job is due, at most ``MAIL_POLL_INTERVAL``"""
+        table = MailJob.__table__
+        with db.engine.connect() as connection:
+            next_run = connection.execute(
+                select(func.min(table.c.run_at)).where(table.c.status.in_(('queued', 'retrying')))
+            ).scalar()
+        poll = self.app.config['MAIL_POLL_INTERVAL']
+        return poll if next_run is None else min(poll, max(next_run - time.time(), 0))
+
+    def _deliver(self, job, connection):
+        permanent = permanent_errors()
+        try:
+            if connection is None:
+                connection = self.mail.connect().__enter__()
+            connection.send(build_message(job['message']))
+        except permanent as e:
+            error = str(e) or type(e).__name__
+            self._finish(job, 'failed', error)
+            logger.error(f"Mail job {job['id']} failed permanently: {error}")
+            return connection
+        except (smtplib.SMTPException, OSError) as e:
+            connection = self._close(connection)
+            error = str(e) or type(e).__name__
+            if job['attempts'] > self.app.config['MAIL_MAX_RETRIES']:
+                self._finish(job, 'failed', error)
+                logger.error(f"Mail job {job['id']} failed after {job['attempts']} attempts: {error}")
+            else:
+                backoff = self.app.config['MAIL_RETRY_BACKOFF'] * 2 ** (job['attempts'] - 1)
+                self._finish(job, 'retrying', error, run_at=time.time() + backoff)
+            return connection
+
+        self._finish(job, 'sent')
+        logger.info(f"Email sent to {', '.join(job['message']['recipients'])}")
+        return connection
+
+    def _finish(self, job, status, error=None, run_at=None):
+        """Record the outcome of a delivery attempt"""
+        table = MailJob.__table__
+        now = time.time()
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(table).where(table.c.id == job['id'])
+                .values(status=status, last_error=error, updated_at=now, run_at=run_at or now)
+            )
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
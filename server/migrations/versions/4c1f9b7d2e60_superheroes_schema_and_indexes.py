@@ -0,0 +1,98 @@
+"""Superheroes schema and secondary indexes
+
+Revision ID: 4c1f9b7d2e60
+Revises: 1ad94e9a547d
+Create Date: 2026-10-17 09:00:00.000000
+
+Databases that were bootstrapped with ``db.create_all()`` already have
+the tables, so each table and index is only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f9b7d2e60'
+down_revision = '1ad94e9a547d'
+branch_labels = None
+depends_on = None
+
+strength_level = sa.Enum('WEAK', 'AVERAGE', 'STRONG', name='strengthlevel')
+
+INDEXES = [
+    ('ix_heroes_name', 'heroes', ['name']),
+    ('ix_heroes_updated_at', 'heroes', ['updated_at']),
+    ('ix_powers_updated_at', 'powers', ['updated_at']),
+    ('ix_hero_powers_power_id', 'hero_powers', ['power_id']),
+    ('ix_hero_powers_updated_at', 'hero_powers', ['updated_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'user' in tables:
+        op.drop_table('user')
+
+    if 'heroes' not in tables:
+        op.create_table('heroes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('super_name', sa.String(length=100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('super_name')
+        )
+    if 'powers' not in tables:
+        op.create_table('powers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+    if 'hero_powers' not in tables:
+        op.create_table('hero_powers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('strength', strength_level, nullable=False),
+        sa.Column('hero_id', sa.Integer(), nullable=False),
+        sa.Column('power_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['hero_id'], ['heroes.id'], ),
+        sa.ForeignKeyConstraint(['power_id'], ['powers.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hero_id', 'power_id', name='unique_hero_power')
+        )
+    if 'stat_counters' not in tables:
+        op.create_table('stat_counters',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    op.drop_table('stat_counters')
+    op.drop_table('hero_powers')
+    op.drop_table('powers')
+    op.drop_table('heroes')
+    strength_level.drop(op.get_bind(), checkfirst=True)
+
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
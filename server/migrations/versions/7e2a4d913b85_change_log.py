@@ -0,0 +1,39 @@
+"""Change log for /api/changes
+
+Revision ID: 7e2a4d913b85
+Revises: 4c1f9b7d2e60
+Create Date: 2026-10-17 14:00:00.000000
+
+Writes made before this revision are not in the log, so clients start
+syncing from the token returned by ``GET /api/changes``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2a4d913b85'
+down_revision = '4c1f9b7d2e60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'changes' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('resource', sa.String(length=20), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_changes_resource', 'changes', ['resource', 'resource_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_changes_resource', table_name='changes')
+    op.drop_table('changes')
@@ -0,0 +1,28 @@
+"""Index hero_powers by strength
+
+Revision ID: 9b3e51c07d24
+Revises: 7e2a4d913b85
+Create Date: 2026-10-17 16:00:00.000000
+
+Serves ``/api/hero_powers?strength=...`` filters. With ``power_id``
+second, it also covers counting holders per power at one strength.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e51c07d24'
+down_revision = '7e2a4d913b85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('hero_powers')}
+    if 'ix_hero_powers_strength' not in existing:
+        op.create_index('ix_hero_powers_strength', 'hero_powers', ['strength', 'power_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_hero_powers_strength', table_name='hero_powers')
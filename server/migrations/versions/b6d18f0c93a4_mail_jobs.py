@@ -0,0 +1,41 @@
+"""Mail jobs table for /api/send_mail
+
+Revision ID: b6d18f0c93a4
+Revises: 9b3e51c07d24
+Create Date: 2026-10-17 22:00:00.000000
+
+Jobs queued before this revision lived in process memory and are gone
+after the restart that applies it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d18f0c93a4'
+down_revision = '9b3e51c07d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'mail_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('mail_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('message', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('run_at', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mail_jobs_due', 'mail_jobs', ['status', 'run_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_mail_jobs_due', table_name='mail_jobs')
+    op.drop_table('mail_jobs')
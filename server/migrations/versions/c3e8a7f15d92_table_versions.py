@@ -0,0 +1,47 @@
+"""Table versions apart from stat_counters
+
+Revision ID: c3e8a7f15d92
+Revises: b6d18f0c93a4
+Create Date: 2026-10-18 10:00:00.000000
+
+The ``version:<table>`` and ``modified:<table>`` rows move from
+``stat_counters`` to ``table_versions`` with their values, so ETags handed
+out before the upgrade stay valid.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a7f15d92'
+down_revision = 'b6d18f0c93a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'table_versions' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('table_versions',
+        sa.Column('resource', sa.String(length=20), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('modified', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('resource')
+        )
+
+    op.execute(
+        "INSERT INTO table_versions (resource, version, modified) "
+        "SELECT substr(v.name, 9), v.value, m.value FROM stat_counters v "
+        "LEFT JOIN stat_counters m ON m.name = 'modified:' || substr(v.name, 9) "
+        "WHERE v.name LIKE 'version:%' "
+        "AND substr(v.name, 9) NOT IN (SELECT resource FROM table_versions)"
+    )
+    op.execute("DELETE FROM stat_counters WHERE name LIKE 'version:%' OR name LIKE 'modified:%'")
+
+
+def downgrade():
+    op.execute("INSERT INTO stat_counters (name, value) SELECT 'version:' || resource, version FROM table_versions")
+    op.execute(
+        "INSERT INTO stat_counters (name, value) "
+        "SELECT 'modified:' || resource, modified FROM table_versions WHERE modified IS NOT NULL"
+    )
+    op.drop_table('table_versions')
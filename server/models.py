@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import validates
-from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import validates, selectinload, joinedload
+from sqlalchemy import UniqueConstraint, select, values, column, literal, true, Integer, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime
 import enum
 
-db = SQLAlchemy()
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class StrengthLevel(enum.Enum):
@@ -14,17 +17,44 @@ class StrengthLevel(enum.Enum):
     STRONG = "Strong"
 
 
+def coerce_strength(value):
+    """Convert a strength given as an enum member or its value to a StrengthLevel"""
+    if isinstance(value, StrengthLevel):
+        return value
+    
+    if isinstance(value, str):
+        try:
+            return StrengthLevel(value)
+        except ValueError:
+            pass
+    
+    valid_values = [level.value for level in StrengthLevel]
+    raise ValueError(f"Strength must be one of: {', '.join(valid_values)}")
+
+
+# The fields of each representation, shared by to_dict and the row plans in serializers.py.
+# Datetimes and enums are left as they are for the JSON provider to encode.
+HERO_FIELDS = ['id', 'name', 'super_name', 'created_at', 'updated_at']
+HERO_SUMMARY_FIELDS = ['id', 'name', 'super_name']
+POWER_FIELDS = ['id', 'name', 'description', 'created_at', 'updated_at']
+HERO_POWER_FIELDS = ['id', 'hero_id', 'power_id', 'strength', 'created_at', 'updated_at']
+
+
+def pick(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+
 class Hero(db.Model):
     __tablename__ = 'heroes'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     super_name = db.Column(db.String(100), nullable=False, unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
-    hero_powers = db.relationship('HeroPower', backref='hero', cascade='all, delete-orphan', lazy='dynamic')
+    hero_powers = db.relationship('HeroPower', backref='hero', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Hero {self.name} ({self.super_name})>'
@@ -36,13 +66,7 @@ class Hero(db.Model):
         return value.strip()
     
     def to_dict(self, include_powers=True):
-        result = {
-            "id": self.id,
-            "name": self.name,
-            "super_name": self.super_name,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
+        result = pick(self, HERO_FIELDS)
         
         if include_powers:
             result["hero_powers"] = [hp.to_dict(include_hero=False) for hp in self.hero_powers]
@@ -50,19 +74,10 @@ class Hero(db.Model):
         return result
     
     def add_power(self, power, strength_level):
-        """Add a power to this hero with specified strength level"""
-        if isinstance(strength_level, str):
-            strength_level = StrengthLevel(strength_level)
-        
-        # Check if hero already has this power
-        existing = HeroPower.query.filter_by(hero_id=self.id, power_id=power.id).first()
-        if existing:
-            existing.strength = strength_level.value
-            return existing
-        
-        hero_power = HeroPower(hero=self, power=power, strength=strength_level.value)
-        db.session.add(hero_power)
-        return hero_power
+        """Add a power to this hero with specified strength level, updating it if already held"""
+        if self.id is None or power.id is None:
+            db.session.flush()
+        return assign_power_to_hero(self.id, power.id, strength_level)
     
     def remove_power(self, power):
         """Remove a power from this hero"""
@@ -84,10 +99,10 @@ class Power(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
-    hero_powers = db.relationship('HeroPower', backref='power', cascade='all, delete-orphan', lazy='dynamic')
+    hero_powers = db.relationship('HeroPower', backref='power', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Power {self.name}>'
@@ -105,24 +120,10 @@ class Power(db.Model):
         return value.strip()
     
     def to_dict(self, include_heroes=False):
-        result = {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
+        result = pick(self, POWER_FIELDS)
         
         if include_heroes:
-            result["heroes"] = [
-                {
-                    "id": hp.hero.id,
-                    "name": hp.hero.name,
-                    "super_name": hp.hero.super_name,
-                    "strength": hp.strength
-                }
-                for hp in self.hero_powers
-            ]
+            result["heroes"] = [dict(pick(hp.hero, HERO_SUMMARY_FIELDS), strength=hp.strength) for hp in self.hero_powers]
         
         return result
     
@@ -137,53 +138,125 @@ class HeroPower(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     strength = db.Column(db.Enum(StrengthLevel), nullable=False)
     hero_id = db.Column(db.Integer, db.ForeignKey('heroes.id'), nullable=False)
-    power_id = db.Column(db.Integer, db.ForeignKey('powers.id'), nullable=False)
+    power_id = db.Column(db.Integer, db.ForeignKey('powers.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
-    # Ensure a hero can't have the same power twice
-    __table_args__ = (UniqueConstraint('hero_id', 'power_id', name='unique_hero_power'),)
+    # Ensure a hero can't have the same power twice (also serves lookups by hero_id)
+    __table_args__ = (
+        UniqueConstraint('hero_id', 'power_id', name='unique_hero_power'),
+        db.Index('ix_hero_powers_strength', 'strength', 'power_id'),
+    )
     
     def __repr__(self):
         return f'<HeroPower {self.hero.name if self.hero else "Unknown"} - {self.power.name if self.power else "Unknown"} ({self.strength.value if isinstance(self.strength, StrengthLevel) else self.strength})>'
     
     @validates('strength')
     def validate_strength(self, key, value):
-        if isinstance(value, StrengthLevel):
-            return value
-        
-        if isinstance(value, str):
-            try:
-                return StrengthLevel(value)
-            except ValueError:
-                pass
-        
-        valid_values = [level.value for level in StrengthLevel]
-        raise ValueError(f"Strength must be one of: {', '.join(valid_values)}")
+        return coerce_strength(value)
     
     def to_dict(self, include_hero=True, include_power=True):
-        result = {
-            "id": self.id,
-            "hero_id": self.hero_id,
-            "power_id": self.power_id,
-            "strength": self.strength.value if isinstance(self.strength, StrengthLevel) else self.strength,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
+        result = pick(self, HERO_POWER_FIELDS)
         
         if include_power and self.power:
             result["power"] = self.power.to_dict(include_heroes=False)
         
         if include_hero and self.hero:
-            result["hero"] = {
-                "id": self.hero.id,
-                "name": self.hero.name,
-                "super_name": self.hero.super_name
-            }
+            result["hero"] = pick(self.hero, HERO_SUMMARY_FIELDS)
         
         return result
 
 
+class StatCounter(db.Model):
+    """Named integers: the running totals behind /api/stats, kept current by triggers
+    installed in stats.py, and the change log's compaction floor"""
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+
+class TableVersion(db.Model):
+    """A table's write count and last write time, behind ETag and Last-Modified; bumped by versions.py"""
+    __tablename__ = 'table_versions'
+    
+    resource = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Unix seconds
+    modified = db.Column(db.Integer, nullable=True)
+    
+    def __repr__(self):
+        return f'<TableVersion {self.resource} v{self.version}>'
+
+
+class Change(db.Model):
+    """One write to a hero, power or hero_power; ``id`` is the /api/changes sync token"""
+    __tablename__ = 'changes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    resource = db.Column(db.String(20), nullable=False)
+    resource_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # AUTOINCREMENT so tokens are never reused after compaction deletes the newest rows
+    __table_args__ = (db.Index('ix_changes_resource', 'resource', 'resource_id'), {'sqlite_autoincrement': True})
+    
+    def __repr__(self):
+        return f'<Change {self.id} {self.resource}:{self.resource_id}{" deleted" if self.deleted else ""}>'
+
+
+class MailJob(db.Model):
+    """One /api/send_mail message and its delivery state, shared by every worker; times are epoch seconds"""
+    __tablename__ = 'mail_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    message = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_at = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+    # Workers look for due jobs by status and time
+    __table_args__ = (db.Index('ix_mail_jobs_due', 'status', 'run_at'),)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "recipients": list(self.message['recipients']),
+            "subject": self.message['subject'],
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+    def __repr__(self):
+        return f'<MailJob {self.id} {self.status}>'
+
+
+# Loader options so serializing related rows costs a fixed number of queries
+def load_hero_powers():
+    """Eager-load a hero's hero_powers together with each power"""
+    return selectinload(Hero.hero_powers).joinedload(HeroPower.power)
+
+
+def load_power_heroes():
+    """Eager-load a power's hero_powers together with each hero"""
+    return selectinload(Power.hero_powers).joinedload(HeroPower.hero)
+
+
+def load_hero_power_parents():
+    """Eager-load a hero_power's hero and power; a list of options"""
+    return [joinedload(HeroPower.hero), joinedload(HeroPower.power)]
+
+
 # Utility functions for common operations
 def create_hero(name, super_name):
     """Create a new hero"""
@@ -199,22 +272,97 @@ def create_power(name, description):
     return power
 
 
+def check_assignment_ids(hero_id, power_id):
+    """Raise ValueError unless both ids are integers; JSON ``true`` would otherwise bind as 1"""
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (hero_id, power_id)):
+        raise ValueError("hero_id and power_id must be integers")
+
+
+def assign_powers(assignments):
+    """Upsert many (hero_id, power_id, strength) triples.
+
+    Each chunk is a single ``INSERT ... SELECT ... ON CONFLICT(hero_id,
+    power_id) DO UPDATE`` whose SELECT joins the incoming rows against
+    heroes and powers, so missing foreign keys are dropped by the same
+    statement instead of being checked first. Returns the written rows as
+    ``(id, hero_id, power_id)``. Raises ValueError for a non-integer id.
+    """
+    insert = _upsert_insert()
+
+    latest = {}
+    for hero_id, power_id, strength in assignments:
+        check_assignment_ids(hero_id, power_id)
+        latest[(hero_id, power_id)] = (hero_id, power_id, coerce_strength(strength))
+    db.session.flush()
+    assignments = list(latest.values())
+
+    table = HeroPower.__table__
+    now = datetime.utcnow()
+    written = []
+    for start in range(0, len(assignments), BULK_CHUNK_SIZE):
+        incoming = values(
+            column('hero_id', Integer),
+            column('power_id', Integer),
+            column('strength', table.c.strength.type),
+            name='incoming'
+        ).data(assignments[start:start + BULK_CHUNK_SIZE]).cte('incoming')
+
+        # WHERE TRUE is deliberate: SQLite's docs require a WHERE on the SELECT of an
+        # INSERT ... SELECT upsert, or the parser may read ON CONFLICT as a join
+        # constraint. It fails that way whenever the last FROM term has no ON clause.
+        rows = select(
+            incoming.c.hero_id,
+            incoming.c.power_id,
+            incoming.c.strength,
+            literal(now, DateTime).label('created_at'),
+            literal(now, DateTime).label('updated_at')
+        ).select_from(
+            incoming
+            .join(Hero.__table__, Hero.__table__.c.id == incoming.c.hero_id)
+            .join(Power.__table__, Power.__table__.c.id == incoming.c.power_id)
+        ).where(true())
+
+        stmt = insert(table).from_select(['hero_id', 'power_id', 'strength', 'created_at', 'updated_at'], rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['hero_id', 'power_id'],
+            set_={'strength': stmt.excluded.strength, 'updated_at': stmt.excluded.updated_at}
+        ).returning(table.c.id, table.c.hero_id, table.c.power_id)
+        written.extend(db.session.execute(stmt).all())
+    notify_bulk_write(HeroPower, written)
+    return written
+
+
+def _missing_references(pairs):
+    """Explain why (hero_id, power_id) pairs were not written; only runs on the failure path"""
+    hero_ids = {hero_id for hero_id, _ in pairs}
+    power_ids = {power_id for _, power_id in pairs}
+    known_heroes = set(db.session.execute(select(Hero.id).where(Hero.id.in_(hero_ids))).scalars())
+    known_powers = set(db.session.execute(select(Power.id).where(Power.id.in_(power_ids))).scalars())
+
+    reasons = {}
+    for hero_id, power_id in pairs:
+        errors = []
+        if hero_id not in known_heroes:
+            errors.append(f"Hero with id {hero_id} not found")
+        if power_id not in known_powers:
+            errors.append(f"Power with id {power_id} not found")
+        reasons[(hero_id, power_id)] = errors
+    return reasons
+
+
 def assign_power_to_hero(hero_id, power_id, strength_level):
     """Assign a power to a hero with specified strength"""
-    hero = Hero.query.get(hero_id)
-    power = Power.query.get(power_id)
+    written = assign_powers([(hero_id, power_id, strength_level)])
     
-    if not hero:
-        raise ValueError(f"Hero with id {hero_id} not found")
-    if not power:
-        raise ValueError(f"Power with id {power_id} not found")
+    if not written:
+        raise ValueError(_missing_references([(hero_id, power_id)])[(hero_id, power_id)][0])
     
-    return hero.add_power(power, strength_level)
+    return db.session.get(HeroPower, written[0].id, populate_existing=True)
 
 
 def get_hero_with_powers(hero_id):
     """Get hero with all their powers"""
-    hero = Hero.query.get(hero_id)
+    hero = Hero.query.options(load_hero_powers()).get(hero_id)
     if not hero:
         return None
     return hero.to_dict(include_powers=True)
@@ -222,7 +370,127 @@ def get_hero_with_powers(hero_id):
 
 def get_power_with_heroes(power_id):
     """Get power with all heroes who have it"""
-    power = Power.query.get(power_id)
+    power = Power.query.options(load_power_heroes()).get(power_id)
     if not power:
         return None
-    return power.to_dict(include_heroes=True)
\ No newline at end of file
+    return power.to_dict(include_heroes=True)
+
+
+# Bulk writes: validate with the @validates rules, then upsert in multi-row statements
+BULK_CHUNK_SIZE = 500
+
+# Core upserts skip the ORM flush, so subsystems that track writes subscribe here.
+# Each listener is called as listener(session, model, rows) where rows carry an ``id``
+# (and ``hero_id``/``power_id`` for HeroPower).
+bulk_write_listeners = []
+
+
+def notify_bulk_write(model, rows):
+    if not rows:
+        return
+    for listener in bulk_write_listeners:
+        listener(db.session, model, rows)
+
+
+def _upsert_insert():
+    """The dialect's INSERT construct with ON CONFLICT support"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    raise ValueError(f"Bulk upsert is not supported on {dialect}")
+
+
+def _upsert(model, rows, conflict_columns, update_columns):
+    """Multi-row INSERT ... ON CONFLICT DO UPDATE in chunks; returns the written ``(id,)`` rows"""
+    insert = _upsert_insert()
+
+    now = datetime.utcnow()
+    written = []
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        chunk = [dict(row, created_at=now, updated_at=now) for row in rows[start:start + BULK_CHUNK_SIZE]]
+        stmt = insert(model.__table__).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: stmt.excluded[column] for column in update_columns + ['updated_at']}
+        ).returning(model.__table__.c.id)
+        written.extend(db.session.execute(stmt).all())
+    notify_bulk_write(model, written)
+    return written
+
+
+def _validate_items(model, items, fields):
+    """Build a transient model per item so its @validates rules run.
+
+    Returns ``(rows, errors)`` where rows are ``(index, values)`` pairs and
+    errors are ``{"index", "errors"}`` dicts. ``None`` items are skipped.
+    """
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": ["Item must be a JSON object"]})
+            continue
+
+        missing = [field for field in fields if field not in item]
+        if missing:
+            errors.append({"index": index, "errors": [f"Missing required fields: {', '.join(missing)}"]})
+            continue
+
+        try:
+            instance = model(**{field: item[field] for field in fields})
+        except (ValueError, AttributeError) as e:
+            errors.append({"index": index, "errors": [str(e)]})
+            continue
+        rows.append((index, {field: getattr(instance, field) for field in fields}))
+    return rows, errors
+
+
+def _last_per_key(rows, key_fields):
+    """Collapse duplicate conflict keys within a batch, keeping the last occurrence"""
+    latest = {}
+    for index, row in rows:
+        latest[tuple(row[field] for field in key_fields)] = row
+    return list(latest.values())
+
+
+def bulk_upsert_heroes(items):
+    """Insert or update heroes keyed on super_name; returns (written, errors)"""
+    rows, errors = _validate_items(Hero, items, ['name', 'super_name'])
+    written = _upsert(Hero, _last_per_key(rows, ['super_name']), ['super_name'], ['name'])
+    return len(written), errors
+
+
+def bulk_upsert_powers(items):
+    """Insert or update powers keyed on name; returns (written, errors)"""
+    rows, errors = _validate_items(Power, items, ['name', 'description'])
+    written = _upsert(Power, _last_per_key(rows, ['name']), ['name'], ['description'])
+    return len(written), errors
+
+
+def bulk_assign_powers(items):
+    """Insert or update hero_powers keyed on (hero_id, power_id); returns (written, errors)"""
+    rows, errors = _validate_items(HeroPower, items, ['hero_id', 'power_id', 'strength'])
+
+    valid = []
+    for index, row in rows:
+        try:
+            check_assignment_ids(row['hero_id'], row['power_id'])
+        except ValueError as e:
+            errors.append({"index": index, "errors": [str(e)]})
+            continue
+        valid.append((index, row))
+
+    written = assign_powers([(row['hero_id'], row['power_id'], row['strength']) for _, row in valid])
+    written_pairs = {(hero_power.hero_id, hero_power.power_id) for hero_power in written}
+
+    failed = [(index, (row['hero_id'], row['power_id'])) for index, row in valid
+              if (row['hero_id'], row['power_id']) not in written_pairs]
+    if failed:
+        reasons = _missing_references({pair for _, pair in failed})
+        errors.extend({"index": index, "errors": reasons[pair]} for index, pair in failed)
+
+    errors.sort(key=lambda error: error["index"])
+    return len(written), errors
@@ -0,0 +1,157 @@
+"""Offset and keyset (cursor) pagination for the list endpoints"""
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+
+from sqlalchemy import select, func, and_, or_, DateTime
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+
+class PageRequest:
+    """Pagination parameters parsed from a request's query string"""
+
+    def __init__(self, page=1, per_page=DEFAULT_PER_PAGE, cursor=None, include_total=False, sort='id'):
+        self.page = max(page, 1)
+        self.per_page = min(per_page, MAX_PER_PAGE) if per_page > 0 else DEFAULT_PER_PAGE
+        self.cursor = cursor
+        self.include_total = include_total
+        self.sort = sort
+
+    @property
+    def sort_key(self):
+        return self.sort.lstrip('-')
+
+    @property
+    def descending(self):
+        """``sort=-name`` orders by name descending, ties broken by descending id"""
+        return self.sort.startswith('-')
+
+    @property
+    def keyset(self):
+        """Cursor mode is opt-in: any ``cursor`` argument, even an empty one, enables it"""
+        return self.cursor is not None
+
+    @classmethod
+    def from_args(cls, args, sortable, default_sort='id'):
+        sort = args.get('sort', default_sort)
+        if sort.lstrip('-') not in sortable or sort.startswith('--'):
+            raise ValueError(f"sort must be one of: {', '.join(sortable)}, optionally prefixed with - for descending")
+
+        return cls(
+            page=_int_arg(args, 'page', 1),
+            per_page=_int_arg(args, 'per_page', DEFAULT_PER_PAGE),
+            cursor=args.get('cursor'),
+            include_total=args.get('include_total', 'false').lower() == 'true',
+            sort=sort
+        )
+
+
+def _int_arg(args, name, default):
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_cursor(sort, values):
+    payload = json.dumps({"s": sort, "v": [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort, columns):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload['v']
+        if payload['s'] != sort or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+def key_columns(page_request, sortable, id_column):
+    """Columns the page is ordered by: the sort column with the primary key as tie-breaker"""
+    sort_column = sortable[page_request.sort_key]
+    if sort_column is id_column:
+        return [id_column]
+    return [sort_column, id_column]
+
+
+def keyset_filter(columns, values, descending=False):
+    """Row-value ``(a, b) > (x, y)`` (``<`` when descending) spelled out so each branch can use an index"""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column < values[i] if descending else column > values[i]))
+    return or_(*clauses)
+
+
+def paginate(session, stmt, page_request, sortable, id_column, scalars=True):
+    """Run ``stmt`` one page at a time and return ``(items, pagination)``.
+
+    Offset mode keeps the classic page/total metadata. Keyset mode seeks
+    past the last key of the previous page, fetches one extra row to learn
+    whether another page exists, and only counts when asked to.
+    """
+    columns = key_columns(page_request, sortable, id_column)
+    stmt = stmt.order_by(*(column.desc() if page_request.descending else column for column in columns))
+
+    total = None
+    if page_request.include_total or not page_request.keyset:
+        total = session.execute(
+            select(func.count()).select_from(stmt.order_by(None).subquery())
+        ).scalar()
+
+    if not page_request.keyset:
+        result = session.execute(
+            stmt.limit(page_request.per_page).offset((page_request.page - 1) * page_request.per_page)
+        )
+        items = result.scalars().all() if scalars else result.all()
+        pages = math.ceil(total / page_request.per_page) if total else 0
+        return items, {
+            "page": page_request.page,
+            "per_page": page_request.per_page,
+            "total": total,
+            "pages": pages,
+            "has_next": page_request.page < pages,
+            "has_prev": page_request.page > 1
+        }
+
+    if page_request.cursor:
+        values = decode_cursor(page_request.cursor, page_request.sort, columns)
+        stmt = stmt.where(keyset_filter(columns, values, page_request.descending))
+
+    result = session.execute(stmt.limit(page_request.per_page + 1))
+    items = result.scalars().all() if scalars else result.all()
+    has_next = len(items) > page_request.per_page
+    items = items[:page_request.per_page]
+
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(page_request.sort, [_key_value(last, column) for column in columns])
+
+    pagination = {
+        "per_page": page_request.per_page,
+        "next_cursor": next_cursor,
+        "has_next": has_next
+    }
+    if total is not None:
+        pagination["total"] = total
+    return items, pagination
+
+
+def _key_value(item, column):
+    if hasattr(item, '_mapping'):
+        return item._mapping[column]
+    return getattr(item, column.key)
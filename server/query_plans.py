@@ -0,0 +1,138 @@
+"""EXPLAIN QUERY PLAN checks for the SQL the read endpoints issue.
+
+Each case is requested through the test client while a cursor listener
+records every statement. Each recorded statement is then explained. A
+filtered statement (one with a WHERE clause) fails the check when SQLite
+plans a bare ``SCAN`` of a real table, i.e. a full table scan rather than
+an index search. Unfiltered statements, such as whole-table counts, are
+listed but not failed because they read every row by definition, and
+neither are virtual (FTS) tables or SQLite's own catalog. Detail cases
+request the first hero and power in the database, and are skipped when
+it has none.
+"""
+import re
+from itertools import combinations
+from urllib.parse import urlencode
+
+from sqlalchemy import event, select, func
+
+from models import Hero, Power
+from pagination import encode_cursor
+
+CASES = [
+    '/api/heroes',
+    '/api/heroes?sort=name&cursor=' + encode_cursor('name', ['M', 1]),
+    '/api/heroes?search=spider',
+    '/api/powers?sort=name&cursor=' + encode_cursor('name', ['M', 1]),
+    '/api/hero_powers?cursor=' + encode_cursor('id', [1]),
+    '/api/hero_powers?hero_id=1',
+    '/api/hero_powers?power_id=1',
+    '/api/heroes?counts=power_count,strong_count',
+    '/api/heroes?sort=-power_count&cursor=' + encode_cursor('-power_count', [3, 100]),
+    '/api/powers?counts=hero_count,weak_count&sort=name',
+    '/api/powers?sort=-hero_count&cursor=' + encode_cursor('-hero_count', [3, 100]),
+    '/api/heroes?ids=1,2,3&counts=power_count',
+    '/api/heroes?ids=1,2,3&include_powers=true',
+    '/api/powers?ids=1,2,3&include_heroes=true',
+    '/api/changes?since=0',
+]
+
+# Every combination of the list filters, plain and with each sort key (ascending and descending).
+# An explicit id sort with a time range is left out: SQLite walks the primary key to avoid sorting,
+# which is the better plan unless the range is narrow.
+HERO_POWER_FILTERS = {
+    'hero_id': '1,2,3',
+    'power_id': '1,2',
+    'strength': 'Strong,Average',
+    'updated_since': '2020-01-01T00:00:00',
+}
+HERO_POWER_SORTS = ['id', '-id', 'updated_at', '-updated_at']
+
+
+def filter_cases(path, filters, sorts):
+    cases = []
+    for size in range(1, len(filters) + 1):
+        for names in combinations(filters, size):
+            cases.append(f"{path}?{urlencode({name: filters[name] for name in names})}")
+    for sort in sorts:
+        cases.append(f"{path}?{urlencode({'sort': sort, 'cursor': ''})}")
+        for name, value in filters.items():
+            if name.startswith('updated_') and sort.lstrip('-') != 'updated_at':
+                continue
+            cases.append(f"{path}?{urlencode({name: value, 'sort': sort, 'cursor': ''})}")
+    return cases
+
+
+CASES += filter_cases('/api/hero_powers', HERO_POWER_FILTERS, HERO_POWER_SORTS)
+CASES += filter_cases('/api/heroes', {'updated_since': '2020-01-01T00:00:00'}, ['-name', 'updated_at', '-updated_at'])
+CASES += filter_cases('/api/powers', {'updated_since': '2020-01-01T00:00:00'}, ['-name', 'updated_at'])
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: LEFT-JOIN)?$')
+FILTERED = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+
+def detail_cases(session):
+    """Detail URLs for the first hero and power, so the check does not depend on particular ids"""
+    hero_id = session.execute(select(func.min(Hero.id))).scalar()
+    power_id = session.execute(select(func.min(Power.id))).scalar()
+    cases = []
+    if hero_id is not None:
+        cases.append(f'/api/heroes/{hero_id}')
+    if power_id is not None:
+        cases.append(f'/api/powers/{power_id}?include_heroes=true')
+    return cases
+
+
+def explain(connection, statement, parameters):
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(app, db, response_cache, cases=None):
+    """Return ``(url, statement, plan, problems)`` for every statement the cases run.
+
+    ``cases`` defaults to ``CASES`` plus the detail cases for the database.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            raise RuntimeError("Query plan checks need SQLite")
+        virtual_tables = {
+            name for (name,) in db.session.connection().exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE sql LIKE 'CREATE VIRTUAL TABLE%'"
+            )
+        }
+        if cases is None:
+            cases = CASES + detail_cases(db.session)
+
+    results = []
+    client = app.test_client()
+    for url in cases:
+        response_cache.clear()
+        captured.clear()
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            response = client.get(url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        if response.status_code >= 400:
+            results.append((url, '', [], [f"request failed with {response.status_code}"]))
+
+        with engine.connect() as connection:
+            for statement, parameters in captured:
+                plan = explain(connection, statement, parameters)
+                problems = []
+                if FILTERED.search(statement):
+                    for detail in plan:
+                        match = FULL_SCAN.match(detail)
+                        table = match and match.group(1)
+                        if table and table not in virtual_tables and not table.startswith('sqlite_'):
+                            problems.append(f"full table scan of {table}")
+                results.append((url, statement, plan, problems))
+    return results
@@ -0,0 +1,134 @@
+"""Read-replica routing for safe GET endpoints.
+
+Replica URIs are registered as Flask-SQLAlchemy binds (``replica_0``,
+``replica_1``, ...), so they get the same engine options as the primary.
+A view wrapped in :meth:`ReplicaSet.reads` picks a healthy replica
+round-robin, and :class:`RoutingSession` sends that request's reads to it.
+Flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+
+A successful write sets a short-lived cookie. While it is present, that
+client reads from the primary so it sees its own writes despite
+replication lag. A replica that fails with a database or connection
+error is taken out of rotation for ``REPLICA_RETRY_INTERVAL`` seconds
+and the request is re-run against the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import g, request, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import DatabaseError, InterfaceError
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+FAILOVER_ERRORS = (DatabaseError, InterfaceError)
+
+
+def replica_binds(uris):
+    """``SQLALCHEMY_BINDS`` entries for the replica URIs"""
+    return {f'replica_{index}': uri for index, uri in enumerate(uris)}
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica chosen for the current request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None and not getattr(clause, 'is_dml', False):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+    def __init__(self, app=None, db=None):
+        self.db = None
+        self.engines = []
+        self._down_until = {}
+        self._cycle = itertools.cycle(())
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_RETRY_INTERVAL', 30)
+        self.db = db
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.retry_interval = app.config['REPLICA_RETRY_INTERVAL']
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        with app.app_context():
+            self.engines = [db.engines[key] for key in binds if key.startswith('replica_')]
+        self._cycle = itertools.cycle(self.engines)
+        if self.engines:
+            app.after_request(self._stick_after_write)
+
+    def choose(self):
+        """The replica for this request, or ``None`` to read from the primary"""
+        if not self.engines or request.cookies.get(STICKY_COOKIE):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in self.engines:
+                engine = next(self._cycle)
+                if self._down_until.get(engine, 0) <= now:
+                    return engine
+        return None
+
+    def mark_down(self, engine, error):
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.retry_interval
+        engine.dispose()
+        logger.warning(f"Replica {engine.url!r} out of rotation for {self.retry_interval}s: {getattr(error, 'orig', error)}")
+
+    def status(self):
+        now = time.monotonic()
+        return [
+            {"url": engine.url.render_as_string(hide_password=True),
+             "healthy": self._down_until.get(engine, 0) <= now}
+            for engine in self.engines
+        ]
+
+    def reads(self, f):
+        """Run a read-only view against a replica, falling back to the primary"""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            engine = self.choose()
+            if engine is None:
+                return f(*args, **kwargs)
+
+            g.db_replica = engine
+            try:
+                return f(*args, **kwargs)
+            except FAILOVER_ERRORS as e:
+                self.mark_down(engine, e)
+                self.db.session.rollback()
+                g.db_replica = None
+                return f(*args, **kwargs)
+            finally:
+                g.pop('db_replica', None)
+        return decorated_function
+
+    def _stick_after_write(self, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def sync_sqlite(self, primary):
+        """Copy the primary SQLite database onto every SQLite replica"""
+        synced = []
+        for engine in self.engines:
+            if engine.dialect.name != 'sqlite' or primary.dialect.name != 'sqlite':
+                continue
+            with primary.connect() as source, engine.connect() as target:
+                source.connection.dbapi_connection.backup(target.connection.dbapi_connection)
+            synced.append(engine)
+        return synced
+
+
+replicas = ReplicaSet()
@@ -0,0 +1,101 @@
+"""Full-text search for heroes and powers.
+
+On SQLite the searchable columns are mirrored into external-content FTS5
+tables that triggers keep in sync with every INSERT, UPDATE and DELETE,
+including bulk Core writes that bypass the ORM. Other databases fall back
+to the original ``ilike`` scan.
+"""
+import re
+
+from sqlalchemy import table, column, literal_column, or_, text
+
+# source table -> (fts table, indexed columns)
+SEARCH_INDEXES = {
+    'heroes': ('heroes_fts', ('name', 'super_name')),
+    'powers': ('powers_fts', ('name', 'description')),
+}
+
+_available = {}
+
+
+def _exists(connection, kind, name):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = :kind AND name = :name"),
+        {"kind": kind, "name": name}
+    ).first() is not None
+
+
+def install_search(connection):
+    """Create the FTS5 tables and sync triggers.
+
+    Existing rows are indexed whenever the triggers were missing: on first
+    install, and after the source table was dropped and recreated.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    for source, (fts_table, columns) in SEARCH_INDEXES.items():
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f'new.{c}' for c in columns)
+        old_cols = ', '.join(f'old.{c}' for c in columns)
+        stale = not _exists(connection, 'trigger', f'{fts_table}_ai')
+
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{cols}, content='{source}', content_rowid='id', "
+            f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        if stale:
+            connection.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+    _available.clear()
+    return True
+
+
+def search_available(session, fts_table):
+    bind = session.get_bind()
+    key = (str(bind.url), fts_table)
+    # Only a found index is cached: another process may run `flask init-db`
+    # or `flask db upgrade` after this one fell back to ilike
+    if not _available.get(key):
+        _available[key] = bind.dialect.name == 'sqlite' and _exists(session, 'table', fts_table)
+    return _available[key]
+
+
+def match_expression(term):
+    """Turn free text into an FTS5 query where every word is a quoted prefix"""
+    words = re.findall(r'\w+', term, re.UNICODE)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def apply_search(session, stmt, model, term, rank=True):
+    """Restrict ``stmt`` to rows of ``model`` matching ``term``.
+
+    With ``rank`` the matches are ordered by FTS5's bm25 relevance first.
+    """
+    fts_table, columns = SEARCH_INDEXES[model.__tablename__]
+    expression = match_expression(term)
+
+    if not expression or not search_available(session, fts_table):
+        return stmt.where(or_(*[getattr(model, c).ilike(f'%{term}%') for c in columns]))
+
+    fts = table(fts_table, column('rowid'), column('rank'))
+    stmt = stmt.join(fts, fts.c.rowid == model.id).where(
+        literal_column(fts_table).op('MATCH')(expression)
+    )
+    if rank:
+        stmt = stmt.order_by(fts.c.rank)
+    return stmt
@@ -1,15 +1,21 @@
 import os
 import sys
+import time
 import random
+import argparse
+import itertools
+from collections import Counter
 from datetime import datetime
 
-from models import db, Hero, Power, HeroPower, StrengthLevel, create_hero, create_power, assign_power_to_hero
-from app import app
+from sqlalchemy import insert
+
+from models import db, Hero, Power, HeroPower, StrengthLevel, create_hero, create_power, assign_powers
+from app import create_app, init_db
+from versions import touch_tables
 
 def clear_database():
-    with app.app_context():
-        db.drop_all()
-        db.create_all()
+    db.drop_all()
+    init_db()
 
 def seed_heroes():
     heroes_data = [
@@ -182,36 +188,29 @@ def seed_hero_powers(heroes, powers):
     hero_dict = {hero.super_name: hero for hero in heroes}
     power_dict = {power.name: power for power in powers}
     
-    hero_powers = []
+    assignments = []
     for assignment in hero_power_assignments:
-        try:
-            hero = hero_dict.get(assignment["hero_name"])
-            power = power_dict.get(assignment["power_name"])
-            
-            if hero and power:
-                hero_power = assign_power_to_hero(
-                    hero.id, 
-                    power.id, 
-                    assignment["strength"]
-                )
-                hero_powers.append(hero_power)
-        except Exception as e:
-            print(f"Error assigning power {assignment['power_name']} to {assignment['hero_name']}: {e}")
+        hero = hero_dict.get(assignment["hero_name"])
+        power = power_dict.get(assignment["power_name"])
+        
+        if hero and power:
+            assignments.append((hero.id, power.id, assignment["strength"]))
     
-    remaining_heroes = [h for h in heroes if h.super_name not in [a["hero_name"] for a in hero_power_assignments]]
+    assigned_heroes = {a["hero_name"] for a in hero_power_assignments}
+    remaining_heroes = [h for h in heroes if h.super_name not in assigned_heroes]
     for hero in remaining_heroes:
         num_powers = random.randint(1, 3)
         available_powers = random.sample(powers, min(num_powers, len(powers)))
         
         for power in available_powers:
-            try:
-                strength = random.choice(strength_levels)
-                hero_power = assign_power_to_hero(hero.id, power.id, strength)
-                hero_powers.append(hero_power)
-            except Exception as e:
-                print(f"Error randomly assigning power {power.name} to {hero.super_name}: {e}")
+            strength = random.choice(strength_levels)
+            assignments.append((hero.id, power.id, strength))
     
-    return hero_powers
+    try:
+        return assign_powers(assignments)
+    except Exception as e:
+        print(f"Error assigning powers: {e}")
+        return []
 
 def print_seeding_summary(heroes, powers, hero_powers):
     print("\n" + "="*60)
@@ -223,9 +222,12 @@ def print_seeding_summary(heroes, powers, hero_powers):
     print(f"Database seeded at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*60)
     
+    powers_per_hero = Counter(hp.hero_id for hp in hero_powers)
+    heroes_per_power = Counter(hp.power_id for hp in hero_powers)
+    
     print("\nHeroes:")
     for hero in heroes[:10]:
-        power_count = len([hp for hp in hero_powers if hp.hero_id == hero.id])
+        power_count = powers_per_hero[hero.id]
         print(f"  - {hero.name} ({hero.super_name}) - {power_count} powers")
     
     if len(heroes) > 10:
@@ -233,17 +235,165 @@ def print_seeding_summary(heroes, powers, hero_powers):
     
     print("\nPowers:")
     for power in powers[:10]:
-        hero_count = len([hp for hp in hero_powers if hp.power_id == power.id])
+        hero_count = heroes_per_power[power.id]
         print(f"  - {power.name} - {hero_count} heroes")
     
     if len(powers) > 10:
         print(f"  ... and {len(powers) - 10} more powers")
 
+FIRST_NAMES = ["Kamala", "Doreen", "Gwen", "Janet", "Wanda", "Carol", "Jean", "Ororo", "Kitty", "Diana",
+               "Kara", "Barbara", "Selina", "Jennifer", "Emma", "Raven", "Anna", "Jessica", "Natasha", "Elektra"]
+LAST_NAMES = ["Khan", "Green", "Stacy", "Van Dyne", "Maximoff", "Danvers", "Grey", "Munroe", "Pryde", "Prince",
+              "Zor-El", "Gordon", "Kyle", "Walters", "Frost", "Darkholme", "Marie", "Drew", "Romanoff", "Natchios"]
+TITLES = ["Captain", "Doctor", "Lady", "Miss", "Dark", "Silver", "Crimson", "Shadow", "Iron", "Phantom"]
+NOUNS = ["Phoenix", "Storm", "Wasp", "Widow", "Falcon", "Comet", "Tempest", "Spectre", "Viper", "Nova"]
+POWER_WORDS = ["Super Strength", "Flight", "Telepathy", "Phasing", "Regeneration", "Teleportation",
+               "Shapeshifting", "Energy Projection", "Precognition", "Weather Control"]
+STRENGTH_NAMES = [level.name for level in StrengthLevel]
+SYNTHETIC_BATCH_SIZE = 50000
+
+def _chunks(count):
+    for start in range(1, count + 1, SYNTHETIC_BATCH_SIZE):
+        yield range(start, min(start + SYNTHETIC_BATCH_SIZE, count + 1))
+
+def synthetic_heroes(rng, count):
+    for ids in _chunks(count):
+        size = len(ids)
+        firsts, lasts = rng.choices(FIRST_NAMES, k=size), rng.choices(LAST_NAMES, k=size)
+        titles, nouns = rng.choices(TITLES, k=size), rng.choices(NOUNS, k=size)
+        for hero_id, first, last, title, noun in zip(ids, firsts, lasts, titles, nouns):
+            yield hero_id, f"{first} {last}", f"{title} {noun} {hero_id}"
+
+def synthetic_powers(rng, count):
+    for ids in _chunks(count):
+        for power_id, word in zip(ids, rng.choices(POWER_WORDS, k=len(ids))):
+            yield power_id, f"{word} {power_id}", f"A synthetic variant of {word.lower()}, level {power_id % 10 + 1}."
+
+def synthetic_links(rng, heroes, powers, links):
+    """``links`` distinct (hero, power) pairs spread as evenly as possible over the heroes.
+
+    Each hero gets a window of consecutive power ids starting at a random
+    power, which keeps the pairs distinct without sampling per hero.
+    """
+    per_hero, extra = divmod(links, heroes)
+    link_id = 1
+    for ids in _chunks(heroes):
+        starts = rng.choices(range(powers), k=len(ids))
+        for hero_id, start in zip(ids, starts):
+            count = per_hero + (hero_id <= extra)
+            strengths = rng.choices(STRENGTH_NAMES, k=count)
+            for offset in range(count):
+                yield link_id, hero_id, (start + offset) % powers + 1, strengths[offset]
+                link_id += 1
+
+def insert_rows(connection, model, columns, rows, stamp):
+    """Insert ``rows`` (tuples for ``columns``) with the same created_at/updated_at, in executemany batches"""
+    table = model.__table__
+    sqlite = connection.dialect.name == 'sqlite'
+    if sqlite:
+        # Plain DBAPI executemany skips SQLAlchemy's per-row parameter processing
+        statement = (
+            f"INSERT INTO {table.name} ({', '.join(columns)}, created_at, updated_at) "
+            f"VALUES ({', '.join('?' * len(columns))}, '{stamp}', '{stamp}')"
+        )
+    
+    written = 0
+    while True:
+        batch = list(itertools.islice(rows, SYNTHETIC_BATCH_SIZE))
+        if not batch:
+            return written
+        if sqlite:
+            connection.exec_driver_sql(statement, batch)
+        else:
+            connection.execute(insert(table), [
+                dict(zip(columns, row), created_at=stamp, updated_at=stamp) for row in batch
+            ])
+        written += len(batch)
+
+def seed_synthetic(heroes, powers, links, seed=42):
+    """Generate heroes, powers and links from ``seed`` and write them in one transaction.
+
+    The tables are recreated without secondary indexes or the search and
+    stats triggers, so rows go in without per-row index or trigger work.
+    The indexes are then built in one pass, and ``init_db`` installs the
+    triggers, rebuilding the search index and counters.
+    """
+    if heroes < 1 or powers < 1:
+        raise ValueError("Need at least one hero and one power")
+    if links > heroes * powers:
+        raise ValueError(f"At most {heroes * powers} distinct links fit {heroes} heroes and {powers} powers")
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    
+    models = (Hero, Power, HeroPower)
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as connection:
+        # Building the secondary indexes once after the load beats updating them row by row
+        for model in models:
+            for index in model.__table__.indexes:
+                index.drop(connection)
+        
+        stamp = now.strftime('%Y-%m-%d %H:%M:%S.%f') if connection.dialect.name == 'sqlite' else now
+        counts = {
+            'heroes': insert_rows(connection, Hero, ['id', 'name', 'super_name'], synthetic_heroes(rng, heroes), stamp),
+            'powers': insert_rows(connection, Power, ['id', 'name', 'description'], synthetic_powers(rng, powers), stamp),
+            'hero_powers': insert_rows(
+                connection, HeroPower, ['id', 'hero_id', 'power_id', 'strength'],
+                synthetic_links(rng, heroes, powers, links), stamp
+            ),
+        }
+        if connection.dialect.name == 'postgresql':
+            # Explicit ids leave the sequences behind
+            for table in counts:
+                connection.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                )
+        
+        for model in models:
+            for index in model.__table__.indexes:
+                index.create(connection)
+        # The rows bypassed the session, so stamp new table versions for ETags and Last-Modified
+        touch_tables(connection, counts)
+    init_db()
+    return counts
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed the superheroes database")
+    parser.add_argument('--heroes', type=int, help="generate this many synthetic heroes instead of the sample data")
+    parser.add_argument('--powers', type=int, default=100)
+    parser.add_argument('--links', type=int, help="hero-power links to generate (default: 3 per hero)")
+    parser.add_argument('--seed', type=int, default=42, help="random seed; the same seed gives the same data")
+    return parser.parse_args()
+
+def main_synthetic(args):
+    links = args.links if args.links is not None else min(3 * args.heroes, args.heroes * args.powers)
+    print(f"Generating {args.heroes} heroes, {args.powers} powers and {links} links (seed {args.seed})...")
+    
+    with create_app().app_context():
+        started = time.perf_counter()
+        counts = seed_synthetic(args.heroes, args.powers, links, args.seed)
+        elapsed = time.perf_counter() - started
+    
+    total = sum(counts.values())
+    print(", ".join(f"{count} {table}" for table, count in counts.items()))
+    print(f"Wrote {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), search index and stats included.")
+
 def main():
+    args = parse_args()
+    if args.heroes is not None:
+        try:
+            main_synthetic(args)
+        except ValueError as e:
+            print(f"Error during seeding: {e}")
+            sys.exit(1)
+        return
+    
     try:
         print("Starting database seeding...")
         
-        with app.app_context():
+        with create_app().app_context():
             clear_database()
             print("Database cleared and recreated.")
             
@@ -0,0 +1,100 @@
+"""Benchmark for list serialization: row plans + orjson against to_dict + json.
+
+Seeds a synthetic database and renders the first N hero_powers, with their
+nested power and hero, both ways. The old path loads ORM objects, calls
+``to_dict`` on each and encodes with the standard library ``json`` module;
+the new one selects the plan's columns, zips rows into dicts and encodes
+with ``FastJSONProvider``. Fetch and encode times are reported apart, and
+both bodies are checked to decode to the same data.
+
+    python serializer_benchmark.py --rows 100,10000,100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers, joinedload
+
+
+def timed(function, runs):
+    """Median seconds per call, and the last result"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='100,10000,100000', help="comma separated list sizes")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.rows.split(',')]
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'serializer.db')}"
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    os.environ.setdefault('INSTRUMENTATION_ENABLED', 'false')
+    os.environ.setdefault('GRAPH_BUILD_ON_START', 'false')
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from models import db, Hero, Power, HeroPower
+    from serializers import FastJSONProvider, HERO_POWER_PLAN, json_default, orjson
+    import seed
+
+    if orjson is None:
+        print("orjson is not installed; the new path falls back to the standard library", file=sys.stderr)
+
+    app = create_app()
+    configure_mappers()
+    stdlib, fast = DefaultJSONProvider(app), FastJSONProvider(app)
+    stdlib.default = json_default
+    with app.app_context():
+        links = max(sizes)
+        print(f"Seeding {links} hero_powers...", file=sys.stderr)
+        seed.seed_synthetic(links // 3 + 1, 100, links)
+        session = db.session
+
+        def old_fetch(size):
+            session.expunge_all()
+            query = select(HeroPower).options(joinedload(HeroPower.hero), joinedload(HeroPower.power)) \
+                .order_by(HeroPower.id).limit(size)
+            return [hero_power.to_dict() for hero_power in session.scalars(query).unique()]
+
+        def new_fetch(size):
+            query = select(*HERO_POWER_PLAN.columns).select_from(HeroPower) \
+                .join(Power, Power.id == HeroPower.power_id).join(Hero, Hero.id == HeroPower.hero_id) \
+                .order_by(HeroPower.id).limit(size)
+            return HERO_POWER_PLAN.to_dicts(session.execute(query).all())
+
+        paths = [
+            ("to_dict + json", old_fetch, stdlib),
+            ("row plan + orjson", new_fetch, fast),
+        ]
+
+        print(f"{'rows':>8}  {'path':<18} {'fetch ms':>9} {'encode ms':>10} {'total ms':>9} {'rows/s':>10} {'speedup':>8}")
+        for size in sizes:
+            baseline = None
+            bodies = []
+            for label, fetch, provider in paths:
+                fetch_time, items = timed(lambda: fetch(size), args.runs)
+                encode_time, body = timed(lambda: provider.response({"hero_powers": items}).get_data(), args.runs)
+                total = fetch_time + encode_time
+                baseline = baseline or total
+                bodies.append(body)
+                print(f"{size:>8}  {label:<18} {fetch_time * 1000:>9.1f} {encode_time * 1000:>10.1f} "
+                      f"{total * 1000:>9.1f} {size / total:>10.0f} {baseline / total:>7.1f}x")
+            if json.loads(bodies[0]) != json.loads(bodies[1]):
+                print(f"{size:>8}  bodies differ between the two paths", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
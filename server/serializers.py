@@ -0,0 +1,125 @@
+"""Row-based serialization for list endpoints and a fast JSON provider.
+
+``RowPlan`` describes once, per model, which columns a representation is
+made of and under which keys. List endpoints select exactly those columns
+and zip each result row into a dict, skipping ORM hydration, ``to_dict``
+and per-field ``isoformat``/``isinstance`` calls. Datetimes and enums are
+left as-is for the encoder, which handles them natively.
+
+The field lists come from models.py, where ``to_dict`` uses them too, so
+the row and ORM paths render a resource the same way.
+
+``FastJSONProvider`` makes ``jsonify`` encode with orjson when it is
+installed and falls back to the standard library otherwise.
+"""
+import enum
+import json
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+from models import Hero, Power, HeroPower, HERO_FIELDS, HERO_SUMMARY_FIELDS, POWER_FIELDS, HERO_POWER_FIELDS
+
+
+class RowPlan:
+    """Maps a flat result row onto a (possibly nested) dict.
+
+    ``fields`` are column attribute names of ``model``; ``nested`` maps a
+    key to another plan whose columns follow in the same row. ``hidden``
+    columns are selected last but left out of the dict, e.g. keys that
+    pagination needs even when the client did not ask for them.
+    """
+
+    def __init__(self, model, fields, nested=None, hidden=()):
+        self.model = model
+        self.fields = list(fields)
+        self.nested = dict(nested or {})
+        self.columns = [getattr(model, field) for field in self.fields]
+        for plan in self.nested.values():
+            self.columns.extend(plan.columns)
+        self.columns.extend(hidden)
+        self._width = len(self.fields)
+        self._slices = []
+        offset = self._width
+        for key, plan in self.nested.items():
+            self._slices.append((key, plan, offset, offset + len(plan.columns)))
+            offset += len(plan.columns)
+
+    @property
+    def allowed_fields(self):
+        return self.fields + list(self.nested)
+
+    def only(self, fields, required=()):
+        """This plan restricted to ``fields``, still selecting the ``required`` columns"""
+        unknown = [field for field in fields if field not in self.allowed_fields]
+        if unknown:
+            raise ValueError(
+                f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(self.allowed_fields)}"
+            )
+        return RowPlan(
+            self.model,
+            [field for field in self.fields if field in fields],
+            {key: plan for key, plan in self.nested.items() if key in fields},
+            hidden=[column for column in required if column.key not in fields]
+        )
+
+    def from_args(self, args, required=()):
+        """The plan for a request's ``fields=a,b`` parameter, or the full plan without one"""
+        fields = [field.strip() for field in args.get('fields', '').split(',') if field.strip()]
+        if not fields:
+            if all(column.key in self.fields for column in required):
+                return self
+            fields = self.allowed_fields
+        return self.only(fields, required)
+
+    def to_dict(self, row):
+        result = dict(zip(self.fields, row[:self._width]))
+        for key, plan, start, end in self._slices:
+            result[key] = plan.to_dict(row[start:end])
+        return result
+
+    def to_dicts(self, rows):
+        if not self._slices:
+            fields = self.fields
+            return [dict(zip(fields, row)) for row in rows]
+        return [self.to_dict(row) for row in rows]
+
+
+HERO_PLAN = RowPlan(Hero, HERO_FIELDS)
+POWER_PLAN = RowPlan(Power, POWER_FIELDS)
+HERO_POWER_PLAN = RowPlan(HeroPower, HERO_POWER_FIELDS, nested={
+    'power': RowPlan(Power, POWER_FIELDS),
+    'hero': RowPlan(Hero, HERO_SUMMARY_FIELDS)
+})
+
+
+def json_default(value):
+    """Encode the datetimes and enums rows and ``to_dict`` leave in place"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode ``obj`` to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=json_default, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses with :func:`dumps`"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
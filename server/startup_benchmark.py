@@ -0,0 +1,129 @@
+"""Startup benchmark: app build time, time-to-first-request and worker memory.
+
+Times ``create_app()`` in fresh interpreters, then boots gunicorn with and
+without ``preload_app``. For each boot it records how long it takes until
+``/api/heroes`` first answers and reads every worker's RSS and PSS from
+/proc. PSS splits the pages workers share, so it shows what preloading
+saves. Linux only.
+
+    python startup_benchmark.py --workers 4
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BUILD_APP = """
+import time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(time.perf_counter() - started)
+"""
+
+
+def build_time(env, runs):
+    timings = [
+        float(subprocess.run(
+            [sys.executable, '-c', BUILD_APP], cwd=HERE, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()[-1])
+        for _ in range(runs)
+    ]
+    return statistics.median(timings)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid):
+    """``(rss, pss)`` of a process in KiB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def boot(env, workers, preload, timeout=30):
+    port = free_port()
+    env = dict(env, GUNICORN_PRELOAD='true' if preload else 'false', WEB_CONCURRENCY=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    url = f'http://127.0.0.1:{port}/api/heroes'
+
+    started = time.perf_counter()
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"gunicorn did not answer {url} within {timeout}s")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        first_request = time.perf_counter() - started
+
+        # Wait until every worker has booted before reading memory
+        while len(children(master.pid)) < workers and time.perf_counter() - started < timeout:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        memory = [memory_kb(pid) for pid in children(master.pid)]
+        master_memory = memory_kb(master.pid)
+    finally:
+        master.terminate()
+        master.wait()
+
+    return {
+        'first_request_ms': round(first_request * 1000),
+        'master_rss_mb': round(master_memory[0] / 1024, 1),
+        'worker_rss_mb': round(statistics.mean(rss for rss, _ in memory) / 1024, 1),
+        'worker_pss_mb': round(statistics.mean(pss for _, pss in memory) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5, help="create_app() timings to take the median of")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}")
+        subprocess.run(
+            [sys.executable, '-c', 'from app import create_app, init_db\nwith create_app().app_context(): init_db()'],
+            cwd=HERE, env=env, check=True, capture_output=True
+        )
+
+        print(f"create_app() in a fresh interpreter: {build_time(env, args.runs) * 1000:.0f} ms (median of {args.runs})")
+        print(f"{'preload':<8} {'first request':>14} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11}")
+        for preload in (False, True):
+            result = boot(env, args.workers, preload)
+            print(
+                f"{str(preload).lower():<8} {result['first_request_ms']:>11} ms {result['master_rss_mb']:>8} MB "
+                f"{result['worker_rss_mb']:>8} MB {result['worker_pss_mb']:>8} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
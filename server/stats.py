@@ -0,0 +1,128 @@
+"""Incrementally maintained counters for /api/stats.
+
+On SQLite, triggers on heroes, powers and hero_powers adjust rows of
+``stat_counters`` in the same transaction as every insert, delete and
+strength change, bulk upserts included. Reading the stats is then a
+single lookup of a handful of rows. ``reconcile_counters`` rebuilds
+the totals from scratch and reports any drift.
+"""
+from sqlalchemy import select, func, text
+
+from models import Hero, Power, HeroPower, StrengthLevel, StatCounter
+
+TABLE_COUNTERS = {'heroes': Hero, 'powers': Power, 'hero_powers': HeroPower}
+STRENGTH_PREFIX = 'strength:'
+
+_available = {}
+
+
+def _triggers(table):
+    def total(sign):
+        return f"UPDATE stat_counters SET value = value {sign} 1 WHERE name = '{table}'"
+
+    def by_strength(sign, row):
+        return f"UPDATE stat_counters SET value = value {sign} 1 WHERE name = '{STRENGTH_PREFIX}' || {row}.strength"
+
+    on_insert = [total('+')]
+    on_delete = [total('-')]
+    statements = []
+    if table == 'hero_powers':
+        on_insert.append(by_strength('+', 'new'))
+        on_delete.append(by_strength('-', 'old'))
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS stat_{table}_au AFTER UPDATE OF strength ON {table} "
+            f"WHEN old.strength IS NOT new.strength BEGIN "
+            f"{by_strength('-', 'old')}; {by_strength('+', 'new')}; END"
+        )
+
+    statements.append(
+        f"CREATE TRIGGER IF NOT EXISTS stat_{table}_ai AFTER INSERT ON {table} BEGIN {'; '.join(on_insert)}; END"
+    )
+    statements.append(
+        f"CREATE TRIGGER IF NOT EXISTS stat_{table}_ad AFTER DELETE ON {table} BEGIN {'; '.join(on_delete)}; END"
+    )
+    return statements
+
+
+def install_counters(connection):
+    """Create the counter triggers, recounting if they were missing or the counters are empty"""
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    stale = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'stat_hero_powers_ai'")
+    ).first() is None
+    for table in TABLE_COUNTERS:
+        for statement in _triggers(table):
+            connection.exec_driver_sql(statement)
+
+    if stale or connection.execute(select(func.count()).select_from(StatCounter.__table__)).scalar() == 0:
+        reconcile_counters(connection)
+
+    _available.clear()
+    return True
+
+
+def _actual_counts(connection):
+    counts = {
+        name: connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+        for name, model in TABLE_COUNTERS.items()
+    }
+    for level in StrengthLevel:
+        counts[STRENGTH_PREFIX + level.name] = 0
+    # Read the stored enum names directly rather than through the Enum type
+    strengths = connection.execute(
+        text("SELECT strength, COUNT(*) FROM hero_powers GROUP BY strength")
+    ).all()
+    for strength, count in strengths:
+        counts[STRENGTH_PREFIX + strength] = count
+    return counts
+
+
+def reconcile_counters(connection):
+    """Recount every total and overwrite the stored counters.
+
+    Returns ``{name: (stored, actual)}`` for each counter that had drifted.
+    """
+    table = StatCounter.__table__
+    stored = dict(connection.execute(select(table.c.name, table.c.value)).all())
+    actual = _actual_counts(connection)
+
+    drift = {}
+    for name, value in actual.items():
+        if name not in stored:
+            connection.execute(table.insert().values(name=name, value=value))
+            if value:
+                drift[name] = (None, value)
+        elif stored[name] != value:
+            connection.execute(table.update().where(table.c.name == name).values(value=value))
+            drift[name] = (stored[name], value)
+    return drift
+
+
+def counters_available(session):
+    bind = session.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        _available[key] = bind.dialect.name == 'sqlite' and session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'stat_hero_powers_ai'")
+        ).first() is not None
+    return _available[key]
+
+
+def read_stats(session):
+    """The /api/stats payload from the counters, or ``None`` if they are not installed"""
+    if not counters_available(session):
+        return None
+
+    counters = dict(session.execute(select(StatCounter.name, StatCounter.value)).all())
+    return {
+        "total_heroes": counters.get('heroes', 0),
+        "total_powers": counters.get('powers', 0),
+        "total_hero_powers": counters.get('hero_powers', 0),
+        "strength_distribution": {
+            str(StrengthLevel[name[len(STRENGTH_PREFIX):]]): value
+            for name, value in counters.items()
+            if name.startswith(STRENGTH_PREFIX) and value
+        }
+    }
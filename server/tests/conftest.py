@@ -0,0 +1,109 @@
+import asyncio
+import json as jsonlib
+from urllib.parse import urlsplit
+
+import pytest
+from asgiref.testing import ApplicationCommunicator
+from sqlalchemy import event
+
+from app import create_app, init_db
+from asgi import PooledWsgiToAsgi
+from models import db
+import seed
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The app on a fresh SQLite file holding the sample data, with the response cache off"""
+    path = tmp_path_factory.mktemp('db') / 'superheroes.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}",
+        'CACHE_BACKEND': 'none',
+        'INSTRUMENTATION_ENABLED': False,
+        'MAIL_SERVER': None,
+        'GRAPH_BUILD_ON_START': False,
+    })
+    with app.app_context():
+        init_db()
+        heroes = seed.seed_heroes()
+        powers = seed.seed_powers()
+        db.session.commit()
+        seed.seed_hero_powers(heroes, powers)
+        db.session.commit()
+    return app
+
+
+class AsgiClient:
+    """Sends requests through the ASGI adapter and returns Flask responses, like ``app.test_client()``"""
+
+    def __init__(self, app):
+        self.app = app
+        self.asgi = PooledWsgiToAsgi(app)
+
+    def open(self, method, path, json=None, headers=None, timeout=10):
+        url = urlsplit(path)
+        headers = dict(headers or {})
+        body = b''
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': url.path, 'query_string': url.query.encode(), 'root_path': '',
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers.items()],
+            'server': ('localhost', 80), 'client': ('127.0.0.1', 1234),
+        }
+
+        async def request():
+            communicator = ApplicationCommunicator(self.asgi, scope)
+            await communicator.send_input({'type': 'http.request', 'body': body})
+            start = await communicator.receive_output(timeout)
+            chunks = []
+            while True:
+                message = await communicator.receive_output(timeout)
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            await communicator.wait(timeout)
+            return start, b''.join(chunks)
+
+        start, content = asyncio.run(request())
+        return self.app.response_class(
+            content, start['status'], [(name.decode('latin1'), value.decode('latin1')) for name, value in start['headers']]
+        )
+
+    def get(self, path, **kwargs):
+        return self.open('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open('DELETE', path, **kwargs)
+
+
+@pytest.fixture(params=['wsgi', 'asgi'])
+def client(app, request):
+    """A client for the WSGI app and one for the ASGI adapter, so each test runs in both modes"""
+    if request.param == 'asgi':
+        return AsgiClient(app)
+    return app.test_client()
+
+
+@pytest.fixture
+def queries(app):
+    """Every statement sent to the database while the test runs"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
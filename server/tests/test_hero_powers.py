@@ -0,0 +1,18 @@
+"""Single and bulk hero_power writes reject the same malformed ids"""
+import pytest
+
+
+@pytest.mark.parametrize('bad_id', [[1], True, '1', 1.0])
+def test_single_assignment_rejects_non_integer_ids(client, bad_id):
+    response = client.post('/api/hero_powers', json={'hero_id': bad_id, 'power_id': 1, 'strength': 'Strong'})
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == ['hero_id and power_id must be integers']
+
+
+@pytest.mark.parametrize('bad_id', [[1], True])
+def test_bulk_assignment_rejects_non_integer_ids(client, bad_id):
+    response = client.post('/api/hero_powers/bulk', json=[{'hero_id': 1, 'power_id': bad_id, 'strength': 'Strong'}])
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [{'index': 0, 'errors': ['hero_id and power_id must be integers']}]
@@ -0,0 +1,20 @@
+"""``ids=`` lookups reject shaping parameters their detail representation cannot honour"""
+import pytest
+
+
+@pytest.mark.parametrize('path, include, count', [('/api/heroes', 'include_powers', 'power_count'),
+                                                  ('/api/powers', 'include_heroes', 'hero_count')])
+@pytest.mark.parametrize('shaping, message', [('fields=id', 'fields'), ('counts={count}', 'counts'),
+                                              ('fields=id&counts={count}', 'fields and counts')])
+def test_include_rejects_fields_and_counts(client, path, include, count, shaping, message):
+    response = client.get(f'{path}?ids=1,2&{include}=true&' + shaping.format(count=count))
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [f'{message} cannot be combined with {include}=true']
+
+
+def test_fields_apply_without_include(client):
+    response = client.get('/api/heroes?ids=2,1&fields=id')
+
+    assert response.status_code == 200
+    assert response.get_json()['heroes'] == [{'id': 2}, {'id': 1}]
@@ -0,0 +1,146 @@
+"""Mail jobs live in the database, so any worker can report on or deliver a job another one accepted.
+
+Delivery is checked against FakeMail and against a local aiosmtpd server.
+"""
+import smtplib
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+
+import app as app_module
+from mail_queue import MailQueue
+from models import db
+
+
+class FakeMail:
+    """Stands in for Flask-Mail; the first ``failures`` sends raise"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.append(message)
+
+
+@pytest.fixture
+def queues(app, monkeypatch):
+    """Two queues on the same database standing in for two gunicorn workers; their threads are stepped by hand"""
+    monkeypatch.setitem(app.config, 'MAIL_QUEUE_WORKERS', 0)
+    monkeypatch.setitem(app.config, 'MAIL_RETRY_BACKOFF', 0)
+    with app.app_context():
+        yield MailQueue(app, FakeMail()), MailQueue(app, FakeMail(failures=1))
+        db.session.remove()
+
+
+def message():
+    return Message(subject='Hello', sender='hq@example.com', recipients=['hero@example.com'], body='Assemble')
+
+
+def status(queue, job_id):
+    db.session.remove()
+    return queue.get(job_id).to_dict()
+
+
+def test_job_is_retried_and_reported_across_workers(queues):
+    accepting, sending = queues
+    job = accepting.submit(message())
+    assert status(sending, job.id)['status'] == 'queued'
+
+    claimed = sending._claim()
+    assert claimed['id'] == job.id
+    assert accepting._claim() is None
+    sending._deliver(claimed, None)
+    assert status(accepting, job.id)['status'] == 'retrying'
+
+    # The retry is picked up by whichever worker polls next
+    accepting._deliver(accepting._claim(), None)
+    report = status(sending, job.id)
+    assert (report['status'], report['attempts'], report['recipients']) == ('sent', 2, ['hero@example.com'])
+    assert [sent.subject for sent in accepting.mail.sent] == ['Hello']
+
+
+def test_job_is_queued_and_reported_over_http(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_SERVER', 'localhost')
+    monkeypatch.setitem(app.config, 'MAIL_DEFAULT_SENDER', 'hq@example.com')
+    monkeypatch.setitem(app.config, 'MAIL_QUEUE_WORKERS', 0)
+    queue = app_module.mail_queue
+    monkeypatch.setattr(queue, 'mail', FakeMail())
+
+    response = client.post('/api/send_mail', json={'to': 'hero@example.com', 'subject': 'Hello', 'body': 'Assemble'})
+    assert response.status_code == 202
+    job_url = response.headers['Location']
+    assert client.get(job_url).get_json()['status'] == 'queued'
+
+    with app.app_context():
+        queue._deliver(queue._claim(), None)
+    assert client.get(job_url).get_json()['status'] == 'sent'
+    assert [sent.recipients for sent in queue.mail.sent] == [['hero@example.com']]
+
+
+class Recorder:
+    """aiosmtpd handler keeping each message with the client address it came from"""
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append((session.peer, envelope.rcpt_tos))
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    recorder = Recorder()
+    controller = Controller(recorder, hostname='127.0.0.1', port=port)
+    controller.start()
+    yield port, recorder
+    controller.stop()
+
+
+def test_batch_is_delivered_over_one_smtp_connection(app, client, monkeypatch, smtp_server):
+    port, recorder = smtp_server
+    for key, value in {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': port, 'MAIL_USE_TLS': False,
+                       'MAIL_DEFAULT_SENDER': 'hq@example.com', 'MAIL_QUEUE_WORKERS': 0}.items():
+        monkeypatch.setitem(app.config, key, value)
+    queue = app_module.mail_queue
+    # Flask-Mail is set up from this config when the first message is queued
+    monkeypatch.setattr(queue, 'mail', None)
+
+    recipients = [f'hero{index}@example.com' for index in range(5)]
+    response = client.post('/api/send_mail/batch', json=[
+        {'to': recipient, 'subject': 'Hello', 'body': 'Assemble'} for recipient in recipients
+    ])
+    assert response.status_code == 202
+    job_ids = [job['job_id'] for job in response.get_json()['jobs']]
+
+    # One worker thread's loop: claim each due job and send it on the connection it keeps open
+    connection = None
+    with app.app_context():
+        while True:
+            job = queue._claim()
+            if job is None:
+                break
+            connection = queue._deliver(job, connection)
+        queue._close(connection)
+
+    assert sorted(rcpt for _, rcpts in recorder.received for rcpt in rcpts) == recipients
+    assert len({peer for peer, _ in recorder.received}) == 1
+    assert {client.get(f'/api/send_mail/{job_id}').get_json()['status'] for job_id in job_ids} == {'sent'}
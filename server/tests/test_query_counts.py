@@ -0,0 +1,79 @@
+"""Each read and write endpoint costs a fixed number of statements, however many related rows it returns"""
+import uuid
+
+import pytest
+
+from models import db, Hero, Power, HeroPower, StrengthLevel
+
+
+def busiest(app, model):
+    """The id of the row with the most hero_powers, so lazy loads would show up as extra queries"""
+    with app.app_context():
+        return max(db.session.execute(db.select(model)).scalars(), key=lambda row: len(row.hero_powers)).id
+
+
+def test_hero_detail(app, client, queries):
+    hero_id = busiest(app, Hero)
+    queries.clear()
+    response = client.get(f'/api/heroes/{hero_id}')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['hero_powers']) > 1
+    # validators, hero, hero_powers with their powers
+    assert len(queries) == 3, queries
+
+
+def test_power_detail_with_heroes(app, client, queries):
+    power_id = busiest(app, Power)
+    queries.clear()
+    response = client.get(f'/api/powers/{power_id}?include_heroes=true')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['heroes']) > 1
+    # validators, power, hero_powers with their heroes
+    assert len(queries) == 3, queries
+
+
+@pytest.mark.parametrize('per_page', [1, 10, 100])
+def test_hero_powers_page(client, queries, per_page):
+    response = client.get(f'/api/hero_powers?per_page={per_page}')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['hero_powers']) == min(per_page, response.get_json()['pagination']['total'])
+    # validators, total, page joined with heroes and powers
+    assert len(queries) == 3, queries
+
+
+def test_hero_update(app, client, queries):
+    hero_id = busiest(app, Hero)
+    queries.clear()
+    response = client.patch(f'/api/heroes/{hero_id}', json={'name': f'Renamed {uuid.uuid4().hex[:8]}'})
+
+    assert response.status_code == 200
+    assert len(response.get_json()['hero_powers']) > 1
+    # hero, update, change log, table version, then the hero reloaded with its hero_powers and powers
+    assert len(queries) == 6, queries
+
+
+def test_hero_power_update(app, client, queries):
+    with app.app_context():
+        hero_power = db.session.execute(db.select(HeroPower).order_by(HeroPower.id)).scalars().first()
+        strength = next(level.value for level in StrengthLevel if level != hero_power.strength)
+    queries.clear()
+    response = client.patch(f'/api/hero_powers/{hero_power.id}', json={'strength': strength})
+
+    assert response.status_code == 200
+    assert response.get_json()['hero']['id'] == hero_power.hero_id
+    # hero_power, update, change log, table version, then the hero_power reloaded with its hero and power
+    assert len(queries) == 5, queries
+
+
+def test_hero_power_create(app, client, queries):
+    hero_id, power_id = busiest(app, Hero), busiest(app, Power)
+    queries.clear()
+    response = client.post('/api/hero_powers', json={'hero_id': hero_id, 'power_id': power_id, 'strength': 'Strong'})
+
+    assert response.status_code == 201
+    assert response.get_json()['power']['id'] == power_id
+    # upsert, change log, table version, the written row, then the row reloaded with its hero and power
+    assert len(queries) == 5, queries
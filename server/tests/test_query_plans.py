@@ -0,0 +1,16 @@
+"""No filtered statement a read endpoint issues is planned as a full table scan"""
+import re
+
+from cache import response_cache
+from models import db
+from query_plans import check_query_plans
+
+
+def test_filtered_reads_use_indexes(app):
+    results = check_query_plans(app, db, response_cache)
+
+    urls = {url for url, _, _, _ in results}
+    assert any(re.fullmatch(r'/api/heroes/\d+', url) for url in urls)
+    assert any(re.fullmatch(r'/api/powers/\d+\?include_heroes=true', url) for url in urls)
+    problems = [(url, ' '.join(statement.split()), plan, problems) for url, statement, plan, problems in results if problems]
+    assert problems == []
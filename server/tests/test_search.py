@@ -0,0 +1,24 @@
+"""Search switches to the FTS index once another process installs it"""
+import sqlite3
+
+from app import create_app
+from models import db
+from search import search_available
+
+
+def test_missing_index_is_checked_again(tmp_path):
+    path = tmp_path / 'search.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}",
+        'CACHE_BACKEND': 'none',
+        'INSTRUMENTATION_ENABLED': False,
+        'GRAPH_BUILD_ON_START': False,
+    })
+    with app.app_context():
+        assert not search_available(db.session, 'heroes_fts')
+
+        # As `flask init-db` in another process would, out of sight of this one's cache
+        with sqlite3.connect(path) as connection:
+            connection.execute("CREATE VIRTUAL TABLE heroes_fts USING fts5(name, super_name)")
+
+        assert search_available(db.session, 'heroes_fts')
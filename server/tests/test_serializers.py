@@ -0,0 +1,16 @@
+"""List rows and ORM ``to_dict`` share their field lists, so both render a resource the same way"""
+
+
+def test_hero_detail_matches_its_list_entry(client):
+    listed = client.get('/api/heroes?per_page=1').get_json()['heroes'][0]
+    detail = client.get(f"/api/heroes/{listed['id']}").get_json()
+
+    assert {key: detail[key] for key in listed} == listed
+
+
+def test_power_heroes_match_hero_power_list(client):
+    hero_power = client.get('/api/hero_powers?per_page=1').get_json()['hero_powers'][0]
+    power = client.get(f"/api/powers/{hero_power['power_id']}?include_heroes=true").get_json()
+
+    assert {key: power[key] for key in hero_power['power']} == hero_power['power']
+    assert dict(hero_power['hero'], strength=hero_power['strength']) in power['heroes']
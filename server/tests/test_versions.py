@@ -0,0 +1,31 @@
+"""List ETags follow table versions, which live apart from the stats counters"""
+import uuid
+
+from models import db, StatCounter, TableVersion
+from stats import reconcile_counters
+
+
+def test_write_changes_list_etag(client, app):
+    first = client.get('/api/powers')
+    assert client.get('/api/powers', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    response = client.post('/api/powers', json={'name': uuid.uuid4().hex, 'description': 'A power to bump the version'})
+    assert response.status_code == 201
+
+    second = client.get('/api/powers', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    with app.app_context():
+        assert db.session.get(TableVersion, 'powers').version >= 1
+        names = db.session.execute(db.select(StatCounter.name)).scalars().all()
+        assert not [name for name in names if name.startswith(('version:', 'modified:'))]
+
+
+def test_reconciling_stats_keeps_versions(client, app):
+    client.post('/api/powers', json={'name': uuid.uuid4().hex, 'description': 'A power to bump the version'})
+    etag = client.get('/api/powers').headers['ETag']
+
+    with app.app_context(), db.engine.begin() as connection:
+        reconcile_counters(connection)
+
+    assert client.get('/api/powers', headers={'If-None-Match': etag}).status_code == 304
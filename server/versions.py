@@ -0,0 +1,59 @@
+"""Table versions and write times behind ETag and Last-Modified.
+
+Each table that a cached representation reads has one row in
+``table_versions``. Every committed write bumps the row's version and
+stamps its write time, in the writing transaction. ``changes.py`` does
+this from the same hooks that log the change. Validating a whole list is
+then one primary-key lookup. Deletes advance the write time just as
+inserts and updates do.
+
+This is kept apart from ``stat_counters``. That table holds the /api/stats
+totals and the change log's compaction floor, and
+``stats.reconcile_counters`` rewrites it.
+"""
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, insert, update
+
+from models import TableVersion
+
+
+def touch_tables(connection, resources):
+    """Bump the version and write time of ``resources`` in the writing transaction"""
+    table = TableVersion.__table__
+    resources = list(resources)
+    now = int(time.time())
+    updated = connection.execute(
+        update(table).where(table.c.resource.in_(resources)).values(version=table.c.version + 1, modified=now)
+    ).rowcount
+    if updated < len(resources):
+        existing = set(connection.execute(select(table.c.resource).where(table.c.resource.in_(resources))).scalars())
+        connection.execute(insert(table), [
+            {'resource': resource, 'version': 1, 'modified': now} for resource in resources if resource not in existing
+        ])
+
+
+def write_time(value):
+    """A stored write time as an aware UTC datetime"""
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+def table_versions(session, resources):
+    """``[(version, modified)]`` for ``resources``; both are ``None`` before the first logged write"""
+    stored = {
+        resource: (version, write_time(modified))
+        for resource, version, modified in session.execute(
+            select(TableVersion.resource, TableVersion.version, TableVersion.modified)
+            .where(TableVersion.resource.in_(resources))
+        )
+    }
+    return [stored.get(resource, (None, None)) for resource in resources]
+
+
+def modified_columns(resources):
+    """Scalar subqueries for the write times of ``resources``, to append to a validator query"""
+    return [
+        select(TableVersion.modified).where(TableVersion.resource == resource).scalar_subquery()
+        for resource in resources
+    ]